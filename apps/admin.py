@@ -1,10 +1,13 @@
 from django.contrib.admin import register, action, StackedInline, ModelAdmin
 from django.db.models import F
 from import_export.admin import ImportExportModelAdmin
+from import_export.resources import ModelResource
 from mptt.admin import DraggableMPTTAdmin
 
-from apps.models import Product, ProductImage, Category, Tag, SiteSettings
-from apps.models.products import Review
+from apps.categories import bulk_category_updates
+from apps.models import Product, ProductImage, Category, Tag, SiteSettings, Order
+from apps.models.products import Review, Coupon
+from apps.utils import invoices_zip_response
 
 
 class ProductImageStackedInline(StackedInline):
@@ -18,6 +21,9 @@ class Product(ModelAdmin):
     list_display = 'title', 'in_stock', 'price'
     inlines = [ProductImageStackedInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('search_vector')
+
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "category":
             # kwargs["queryset"] = Category.objects.filter(children__isnull=True)
@@ -32,9 +38,18 @@ class Product(ModelAdmin):
     get_in_stock.boolean = True
 
 
+class CategoryResource(ModelResource):
+    class Meta:
+        model = Category
+
+    def import_data(self, dataset, dry_run=False, *args, **kwargs):
+        with bulk_category_updates(rebuild=not dry_run):
+            return super().import_data(dataset, dry_run, *args, **kwargs)
+
+
 @register(Category)
 class CategoryModelAdmin(DraggableMPTTAdmin, ImportExportModelAdmin):
-    pass
+    resource_classes = [CategoryResource]
 
 
 @register(Review)
@@ -48,6 +63,26 @@ class TagModelAdmin(ModelAdmin):
     pass
 
 
+@register(Coupon)
+class CouponModelAdmin(ModelAdmin):
+    list_display = 'code', 'discount_amount', 'active', 'usage_limit', 'per_user_limit', 'valid_until'
+    list_filter = 'active',
+    search_fields = 'code',
+
+
+@register(Order)
+class OrderModelAdmin(ModelAdmin):
+    list_display = 'id', 'owner', 'status', 'payment_method', 'total', 'created_at'
+    list_filter = 'status', 'payment_method', 'created_at'
+    list_select_related = 'owner',
+    date_hierarchy = 'created_at'
+    actions = 'download_invoices',
+
+    @action(description='Download invoices (.zip)')
+    def download_invoices(self, request, queryset):
+        return invoices_zip_response(queryset)
+
+
 @register(SiteSettings)
 class Tax(ModelAdmin):
     pass
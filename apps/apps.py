@@ -6,5 +6,6 @@ class AppsConfig(AppConfig):
     name = 'apps'
 
     def ready(self):
+        import apps.checks
         import apps.signals
         super().ready()
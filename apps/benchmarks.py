@@ -0,0 +1,285 @@
+import random
+import statistics
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import Count
+from django.http import QueryDict
+
+from apps.cache import get_category_index, get_category_tree, invalidate_catalog, invalidate_category_tree
+from apps.categories import bulk_category_updates, filter_by_category, find_tree_errors, rebuild_category_tree
+from apps.facets import PRICE_BANDS, compute_facets, price_band_q
+from apps.forms import OrderCreateModelForm
+from apps.models import Address, Category, Order, OrderItem, Product, ProductSpecification, Tag, User
+from apps.models.products import CartItem
+from apps.specifications import filter_by_specification
+
+BENCHMARK_BATCH_SIZE = 5000
+
+
+@contextmanager
+def rolled_back():
+    # synthetic catalogs are generated inside a transaction that is never committed
+    try:
+        with transaction.atomic():
+            yield
+            transaction.set_rollback(True)
+    finally:
+        # anything cached from the synthetic rows must not outlive them
+        invalidate_category_tree()
+        invalidate_catalog()
+
+
+def timed(fn, repeat=5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def synthetic_categories(size, fanout=10):
+    categories = Category.objects.bulk_create(
+        [Category(name='Bench 0', slug='bench-0', parent=None, tree_id=0, lft=0, rght=0, level=0)]
+    )
+    level, created = categories, 1
+    while created < size:
+        children = []
+        for parent in level:
+            for _ in range(min(fanout, size - created - len(children))):
+                n = created + len(children)
+                children.append(Category(name=f'Bench {n}', slug=f'bench-{n}', parent=parent,
+                                         tree_id=0, lft=0, rght=0, level=0))
+        level = Category.objects.bulk_create(children, batch_size=BENCHMARK_BATCH_SIZE)
+        categories.extend(level)
+        created += len(level)
+    rebuild_category_tree()
+    return categories
+
+
+def synthetic_products(count, category_ids, start=0, seed=0, tag_ids=()):
+    rng = random.Random(seed)
+    through = Product.tags.through
+    for offset in range(start, start + count, BENCHMARK_BATCH_SIZE):
+        products = Product.objects.bulk_create([
+            Product(
+                title=f'Bench product {n}', short_description='Synthetic product', long_description='',
+                price=rng.randrange(1, 2000), stock=rng.choice((0, 0, 5, 10, 50)),
+                category_id=rng.choice(category_ids),
+            )
+            for n in range(offset, min(offset + BENCHMARK_BATCH_SIZE, start + count))
+        ])
+        if tag_ids:
+            through.objects.bulk_create([
+                through(product_id=product.pk, tag_id=tag_id)
+                for product in products
+                for tag_id in rng.sample(tag_ids, 2)
+            ])
+
+
+def descendant_ids(category_id):
+    children = defaultdict(list)
+    for pk, parent_id in Category.objects.values_list('pk', 'parent_id'):
+        children[parent_id].append(pk)
+    ids, stack = [], [category_id]
+    while stack:
+        pk = stack.pop()
+        ids.append(pk)
+        stack.extend(children[pk])
+    return ids
+
+
+def benchmark_category_filter(size=10_000, products=100_000, fanout=10, repeat=5):
+    results = []
+    with rolled_back():
+        categories = synthetic_categories(size, fanout)
+        synthetic_products(products, [category.pk for category in categories])
+
+        nodes = Category.objects.values('pk', 'slug', 'lft', 'rght')
+        by_span = sorted(nodes, key=lambda node: node['rght'] - node['lft'], reverse=True)
+        samples = [by_span[0], by_span[1], by_span[fanout + 1], by_span[-1]]
+
+        for node in samples:
+            def by_range():
+                qs = filter_by_category(Product.objects.all(), node['slug'])
+                return qs.count(), list(qs.order_by('-created_at')[:10])
+
+            def by_expansion():
+                qs = Product.objects.filter(category_id__in=descendant_ids(node['pk']))
+                return qs.count(), list(qs.order_by('-created_at')[:10])
+
+            results.append({
+                'category': node['slug'],
+                'descendants': (node['rght'] - node['lft'] - 1) // 2,
+                'products': by_range()[0],
+                'range_ms': timed(by_range, repeat),
+                'expansion_ms': timed(by_expansion, repeat),
+            })
+    return results
+
+
+def grouped_facets_per_query(qs, category_slug=None):
+    # the per-facet baseline: one COUNT per price band, stock state and child category, plus the tag query
+    index = get_category_index()
+    selected = index.get(category_slug)
+    children = selected['children'] if selected else get_category_tree()
+    return {
+        'categories': [filter_by_category(qs, child['slug']).count() for child in children],
+        'price': [qs.filter(price_band_q(i)).count() for i in range(len(PRICE_BANDS))],
+        'in_stock': qs.filter(stock__gt=0).count(),
+        'out_of_stock': qs.filter(stock=0).count(),
+        'tags': list(Tag.objects.filter(product__in=qs.order_by().values('pk')).annotate(
+            count=Count('product')
+        ).order_by('-count', 'name').values('name', 'count')[:20]),
+    }
+
+
+def benchmark_facets(products=1_000_000, categories=1000, tags=50, repeat=3):
+    results = []
+    with rolled_back():
+        category_ids = [category.pk for category in synthetic_categories(categories)]
+        tag_ids = [tag.pk for tag in Tag.bulk_create_with_slugs([Tag(name=f'Bench tag {i}') for i in range(tags)])]
+        synthetic_products(products, category_ids, tag_ids=tag_ids)
+
+        child = get_category_index()['bench-0']['children'][0]
+        cases = [
+            ('all products', Product.objects.all(), None),
+            (f'category {child["slug"]}', filter_by_category(Product.objects.all(), child['slug']), child['slug']),
+            ('in stock, $100-500', Product.objects.filter(price_band_q(2), stock__gt=0), None),
+        ]
+        for name, qs, category_slug in cases:
+            results.append({
+                'case': name,
+                'products': qs.count(),
+                'single_pass_ms': timed(lambda: compute_facets(qs, category_slug), repeat),
+                'per_query_ms': timed(lambda: grouped_facets_per_query(qs, category_slug), repeat),
+            })
+    return results
+
+
+def synthetic_specifications(product_ids, rng, matches):
+    colors, memory = ('black', 'white', 'blue', 'green'), ('64gb', '128gb', '256gb')
+    rows = []
+    for pk in product_ids:
+        match = pk in matches
+        rows.append(ProductSpecification(product_id=pk, key='color', value='red' if match else rng.choice(colors)))
+        rows.append(ProductSpecification(product_id=pk, key='memory', value='16gb' if match else rng.choice(memory)))
+    ProductSpecification.objects.bulk_create(rows, batch_size=BENCHMARK_BATCH_SIZE)
+
+
+def benchmark_specification_filters(sizes=(10_000, 100_000, 1_000_000), matches=100, repeat=5):
+    cases = [
+        ('spec.color=red', QueryDict('spec.color=red')),
+        ('spec.color=red&spec.memory=16gb', QueryDict('spec.color=red&spec.memory=16gb')),
+        ('spec.color=black', QueryDict('spec.color=black')),
+    ]
+    results = []
+    with rolled_back():
+        category_ids = [category.pk for category in synthetic_categories(100)]
+        rng, generated, last_pk = random.Random(0), 0, 0
+        for size in sizes:
+            synthetic_products(size - generated, category_ids, start=generated, seed=size)
+            generated = size
+            product_ids = list(Product.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True))
+            last_pk = product_ids[-1]
+            # the selective filters match the same products at every size, so only the catalog grows
+            matching = set(rng.sample(product_ids, matches)) if size == sizes[0] else set()
+            synthetic_specifications(product_ids, rng, matching)
+
+            for name, params in cases:
+                qs = filter_by_specification(Product.objects.all(), params)
+                results.append({
+                    'size': size,
+                    'filter': name,
+                    'matches': qs.count(),
+                    'page_ms': timed(lambda: list(qs.order_by('-created_at')[:10]), repeat),
+                    'count_ms': timed(qs.count, repeat),
+                })
+    return results
+
+
+def _load_category_tree(size, fanout):
+    level, created = [Category.objects.create(name='Bench 0')], 1
+    while created < size:
+        children = []
+        for parent in level:
+            for _ in range(min(fanout, size - created - len(children))):
+                children.append(Category.objects.create(name=f'Bench {created + len(children)}', parent=parent))
+        level = children
+        created += len(children)
+
+
+def benchmark_category_loads(sizes=(1500, 3000), fanout=10):
+    results = []
+    for size in sizes:
+        row = {'size': size}
+        with rolled_back():
+            started = time.perf_counter()
+            _load_category_tree(size, fanout)
+            row['per_row_s'] = time.perf_counter() - started
+
+        with rolled_back():
+            started = time.perf_counter()
+            with bulk_category_updates():
+                _load_category_tree(size, fanout)
+            row['deferred_s'] = time.perf_counter() - started
+            row['errors'] = len(find_tree_errors())
+        results.append(row)
+    return results
+
+
+def _order_form(order: Order):
+    form = OrderCreateModelForm({'payment_method': order.payment_method, 'address': order.address_id,
+                                 'owner': order.owner_id})
+    form.is_valid()
+    return form
+
+
+def place_order_per_row(order: Order):
+    # the checkout path this replaced: no transaction, no stock, one INSERT and one lazy product load per line
+    order = _order_form(order).save(commit=False)
+    order.save()
+    for cart_item in order.owner.cart_items.all():
+        OrderItem.objects.create(order=order, quantity=cart_item.quantity, product=cart_item.product)
+    CartItem.objects.filter(user=order.owner).delete()
+
+
+def place_order(order: Order):
+    return _order_form(order).save()
+
+
+def synthetic_checkouts(count, lines, prefix):
+    category_ids = [category.pk for category in synthetic_categories(10)]
+    synthetic_products(lines, category_ids, seed=count)
+    products = list(Product.objects.order_by('-pk')[:lines])
+    Product.objects.filter(pk__in=[product.pk for product in products]).update(stock=count * 10)
+    orders = []
+    for i in range(count):
+        user = User.objects.create_user(f'{prefix}-{i}')
+        address = Address.objects.create(user=user, full_name='Bench', street='Main', zip_code=1, city='City',
+                                         phone='0')
+        CartItem.objects.bulk_create([CartItem(user=user, product=product, quantity=1) for product in products])
+        orders.append(Order(owner=user, address=address, payment_method='paypal'))
+    return orders
+
+
+def benchmark_checkout(orders=200, lines=(1, 10, 25)):
+    results = []
+    for size in lines:
+        row = {'lines': size}
+        for name, place in (('per_row', place_order_per_row), ('bulk', place_order)):
+            with rolled_back():
+                pending = synthetic_checkouts(orders, size, f'bench-{name}-{size}')
+                queries = []
+                with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                    started = time.perf_counter()
+                    for order in pending:
+                        place(order)
+                    elapsed = time.perf_counter() - started
+                row[f'{name}_orders_per_s'] = orders / elapsed
+                row[f'{name}_queries'] = len(queries) / orders
+        results.append(row)
+    return results
@@ -0,0 +1,122 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.models import Category, SiteSettings
+
+CATEGORY_TREE = 'category_tree'
+CATALOG = 'catalog'
+SITE_SETTINGS = 'site_settings'
+
+_deferred = threading.local()
+
+
+def get_version(name):
+    key = f'{name}:version'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    pending = getattr(_deferred, 'names', None)
+    if pending is not None:
+        pending.add(name)
+        return
+    # bumping before commit would let a concurrent reader cache pre-commit data under the new version
+    transaction.on_commit(lambda: cache.set(f'{name}:version', time.time_ns(), None))
+
+
+@contextmanager
+def deferred_invalidation():
+    if getattr(_deferred, 'names', None) is not None:
+        yield
+        return
+    _deferred.names = set()
+    try:
+        yield
+    finally:
+        names, _deferred.names = _deferred.names, None
+        for name in names:
+            bump_version(name)
+
+
+def build_category_tree():
+    nodes = {}
+    roots = []
+    rows = Category.objects.order_by('tree_id', 'lft').values(
+        'id', 'parent_id', 'name', 'slug', 'tree_id', 'lft', 'rght', 'level'
+    )
+    for row in rows:
+        node = nodes[row['id']] = {**row, 'children': []}
+        parent = nodes.get(row['parent_id'])
+        (parent['children'] if parent else roots).append(node)
+    return roots
+
+
+@lru_cache(maxsize=8)
+def _category_tree(version):
+    key = f'{CATEGORY_TREE}:{version}'
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(key, tree, settings.CATEGORY_TREE_CACHE_TIMEOUT)
+    return tree
+
+
+def get_category_tree():
+    return _category_tree(get_version(CATEGORY_TREE))
+
+
+@lru_cache(maxsize=8)
+def _category_index(version):
+    index = {}
+    stack = list(_category_tree(version))
+    while stack:
+        node = stack.pop()
+        index[node['id']] = index[node['slug']] = node
+        stack.extend(node['children'])
+    return index
+
+
+def get_category_index():
+    return _category_index(get_version(CATEGORY_TREE))
+
+
+def invalidate_category_tree():
+    bump_version(CATEGORY_TREE)
+
+
+def catalog_page_key(request):
+    versions = f'{get_version(CATALOG)}|{get_version(CATEGORY_TREE)}'
+    digest = hashlib.md5(f'{request.get_full_path()}|{versions}'.encode()).hexdigest()
+    return f'{CATALOG}:page:{digest}'
+
+
+def invalidate_catalog():
+    bump_version(CATALOG)
+
+
+def load_tax_percent():
+    return SiteSettings.objects.values_list('tax', flat=True).first() or 0
+
+
+def get_tax_percent():
+    key = f'{SITE_SETTINGS}:{get_version(SITE_SETTINGS)}'
+    tax_percent = cache.get(key)
+    if tax_percent is None:
+        tax_percent = load_tax_percent()
+        cache.set(key, tax_percent, settings.SITE_SETTINGS_CACHE_TIMEOUT)
+    return tax_percent
+
+
+def invalidate_site_settings():
+    bump_version(SITE_SETTINGS)
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from apps.cache import get_version, bump_version
+from apps.models import Product
+from apps.models.products import CartItem
+from apps.pricing import CART_LINE_FIELDS, calculate
+
+CART = 'cart'
+
+
+def _key(user_id):
+    return f'{CART}:{get_version(CART)}:{user_id}'
+
+
+def compute_cart_summary(user_id):
+    return calculate(CartItem.objects.filter(user_id=user_id).values_list(*CART_LINE_FIELDS))
+
+
+def get_cart_summary(user_id):
+    key = _key(user_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_cart_summary(user_id)
+        cache.set(key, summary, settings.CART_SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def cart_changed(user_id):
+    # drop the summary rather than patching it: concurrent read-modify-write of a cached dict loses updates
+    cache.delete(_key(user_id))
+
+
+def add_to_cart(user_id, product: Product, quantity=1) -> int:
+    items = CartItem.objects.filter(user_id=user_id, product=product)
+    with transaction.atomic():
+        if not items.update(quantity=F('quantity') + quantity):
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(user_id=user_id, product=product, quantity=quantity)
+            except IntegrityError:
+                items.update(quantity=F('quantity') + quantity)
+        new_quantity = items.values_list('quantity', flat=True).get()
+    # invalidate after the commit so a concurrent read cannot re-cache the pre-add summary
+    cart_changed(user_id)
+    return new_quantity
+
+
+def set_cart_quantity(user_id, pk, quantity) -> int:
+    with transaction.atomic():
+        cart_item = CartItem.objects.select_for_update().get(user_id=user_id, pk=pk)
+        if cart_item.quantity != quantity:
+            cart_item.quantity = quantity
+            cart_item.save(update_fields=['quantity'])
+    cart_changed(user_id)
+    return quantity
+
+
+def invalidate_cart_summaries():
+    bump_version(CART)
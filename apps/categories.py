@@ -0,0 +1,97 @@
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction, connections, router
+
+from apps.cache import deferred_invalidation, get_category_index, invalidate_category_tree, invalidate_catalog
+from apps.models import Category
+
+
+def rebuild_category_tree(using=None):
+    using = using or router.db_for_write(Category)
+    rows = Category.objects.using(using).order_by(*Category._mptt_meta.order_insertion_by, 'pk').values_list(
+        'id', 'parent_id', 'tree_id', 'lft', 'rght', 'level'
+    )
+    current, roots, children = {}, [], defaultdict(list)
+    for pk, parent_id, *fields in rows:
+        current[pk] = tuple(fields)
+        (children[parent_id] if parent_id is not None else roots).append(pk)
+
+    updates = []
+    for tree_id, root in enumerate(roots, 1):
+        counter, lefts, stack = 1, {}, [(root, 0, False)]
+        while stack:
+            pk, level, visited = stack.pop()
+            if not visited:
+                lefts[pk], counter = counter, counter + 1
+                stack.append((pk, level, True))
+                stack.extend((child, level + 1, False) for child in reversed(children[pk]))
+                continue
+            fields, counter = (tree_id, lefts[pk], counter, level), counter + 1
+            if current[pk] != fields:
+                updates.append((*fields, pk))
+
+    opts = Category._mptt_meta
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {Category._meta.db_table} SET {opts.tree_id_attr} = %s, {opts.left_attr} = %s, "
+            f"{opts.right_attr} = %s, {opts.level_attr} = %s WHERE id = %s",
+            updates
+        )
+    return len(updates)
+
+
+def filter_by_category(qs, slug):
+    # a plain range join lets the planner drive from the category index; a correlated EXISTS runs once per product
+    node = get_category_index().get(slug)
+    if node is None:
+        return qs.none()
+    return qs.filter(
+        category__tree_id=node['tree_id'], category__lft__gte=node['lft'], category__rght__lte=node['rght']
+    )
+
+
+@contextmanager
+def bulk_category_updates(rebuild=True):
+    # the deferral wraps the transaction so the collected bumps are published after the commit, not before it
+    with deferred_invalidation(), transaction.atomic():
+        with Category.objects.disable_mptt_updates():
+            yield
+        if rebuild:
+            rebuild_category_tree()
+        invalidate_category_tree()
+        invalidate_catalog()
+
+
+def find_tree_errors():
+    nodes = {row[0]: row for row in Category.objects.values_list('id', 'parent_id', 'tree_id', 'lft', 'rght', 'level')}
+    roots = defaultdict(list)
+    for pk, parent_id, tree_id, lft, rght, level in nodes.values():
+        if parent_id is None:
+            roots[tree_id].append(pk)
+
+    errors = [f'tree {tree_id} has {len(pks)} roots' for tree_id, pks in roots.items() if len(pks) > 1]
+    descendants = defaultdict(int)
+    for pk, parent_id, tree_id, lft, rght, level in nodes.values():
+        if lft >= rght or (rght - lft) % 2 == 0:
+            errors.append(f'category {pk}: invalid bounds {lft}..{rght}')
+        parent = nodes.get(parent_id)
+        if parent_id is not None and parent is None:
+            errors.append(f'category {pk}: missing parent {parent_id}')
+        elif parent is None:
+            if level != 0 or lft != 1:
+                errors.append(f'category {pk}: root at level {level}, lft {lft}')
+        elif parent[2] != tree_id or not parent[3] < lft < rght < parent[4] or level != parent[5] + 1:
+            errors.append(f'category {pk}: not nested inside parent {parent_id}')
+        ancestor, seen = parent, set()
+        while ancestor is not None and ancestor[0] not in seen:
+            seen.add(ancestor[0])
+            descendants[ancestor[0]] += 1
+            ancestor = nodes.get(ancestor[1])
+        if ancestor is not None:
+            errors.append(f'category {pk}: parent links form a cycle')
+
+    for pk, parent_id, tree_id, lft, rght, level in nodes.values():
+        if (rght - lft - 1) // 2 != descendants[pk]:
+            errors.append(f'category {pk}: {descendants[pk]} descendants but bounds span {(rght - lft - 1) // 2}')
+    return errors
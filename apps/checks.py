@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.checks import Warning, register, Tags
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache':
+        return []
+    return [Warning(
+        'The default cache is a per-process LocMemCache.',
+        hint='Cache invalidations made by one web or Celery process are not seen by the others; '
+             'set REDIS_CACHE_URL to share the cache.',
+        id='apps.W001',
+    )]
@@ -0,0 +1,144 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+
+from apps.cache import get_version, bump_version
+from apps.models.products import Coupon, CouponRedemption
+
+COUPONS = 'coupons'
+
+
+def normalize_code(code) -> str:
+    return (code or '').strip().upper()
+
+
+def get_coupon(code):
+    code = normalize_code(code)
+    if not code:
+        return None
+    key = f'{COUPONS}:{get_version(COUPONS)}:{code}'
+    coupon = cache.get(key)
+    if coupon is None:
+        coupon = Coupon.objects.filter(code__iexact=code, active=True).first() or False
+        cache.set(key, coupon, settings.COUPON_CACHE_TIMEOUT)
+    return coupon or None
+
+
+def invalidate_coupons():
+    bump_version(COUPONS)
+
+
+def _usage_key(coupon: Coupon):
+    return f'{COUPONS}:used:{coupon.pk}'
+
+
+def _limits(coupon: Coupon, user_id):
+    if coupon.usage_limit is not None:
+        yield (
+            _usage_key(coupon), coupon.usage_limit,
+            lambda: coupon.redemptions.count(),
+            'This coupon has been fully redeemed.',
+        )
+    if coupon.per_user_limit is not None:
+        yield (
+            f'{COUPONS}:used:{coupon.pk}:{user_id}', coupon.per_user_limit,
+            lambda: CouponRedemption.objects.filter(coupon=coupon, user_id=user_id).count(),
+            'You have already used this coupon.',
+        )
+
+
+def _used(key, seed):
+    used = cache.get(key)
+    return seed() if used is None else used
+
+
+def _incr(key, seed):
+    if cache.get(key) is None:
+        cache.add(key, seed(), None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, seed(), None)
+        return cache.incr(key)
+
+
+def release_coupon(keys):
+    for key in keys:
+        try:
+            cache.decr(key)
+        except ValueError:
+            pass
+
+
+def check_coupon(code, user_id) -> Coupon:
+    coupon = get_coupon(code)
+    if coupon is None:
+        raise ValidationError('This coupon code is not valid.')
+
+    current = now()
+    if coupon.valid_from and current < coupon.valid_from:
+        raise ValidationError('This coupon is not active yet.')
+    if coupon.valid_until and current >= coupon.valid_until:
+        raise ValidationError('This coupon has expired.')
+
+    for key, limit, seed, message in _limits(coupon, user_id):
+        if _used(key, seed) >= limit:
+            raise ValidationError(message)
+    return coupon
+
+
+def reserve_coupon(coupon: Coupon, user_id):
+    keys, slot = [], None
+    for key, limit, seed, message in _limits(coupon, user_id):
+        keys.append(key)
+        used = _incr(key, seed)
+        if used > limit:
+            release_coupon(keys)
+            raise ValidationError(message)
+        if key == _usage_key(coupon):
+            slot = used - 1
+    return keys, slot
+
+
+def _free_slot(taken, limit):
+    taken = set(taken)
+    return next((slot for slot in range(limit) if slot not in taken), None)
+
+
+def redeem_coupon(coupon: Coupon, order, slot=None):
+    # the authoritative limit check, run inside the order transaction. Every redemption claims a unique
+    # (coupon, slot) below usage_limit and a unique (coupon, user, user_slot) below per_user_limit, so concurrent
+    # checkouts insert different rows instead of queueing on one counter row. The slot handed out by the cache
+    # counter is tried first; the free slots are only looked up when it turns out to be taken.
+    redemptions = CouponRedemption.objects.filter(coupon=coupon)
+    user_redemptions = redemptions.filter(user_id=order.owner_id)
+    if coupon.usage_limit is None:
+        slot = None
+    elif slot is None or slot >= coupon.usage_limit:
+        slot = _free_slot(redemptions.values_list('slot', flat=True), coupon.usage_limit)
+    user_slot = None
+    if coupon.per_user_limit is not None:
+        user_slot = _free_slot(user_redemptions.values_list('user_slot', flat=True), coupon.per_user_limit)
+
+    while True:
+        if coupon.per_user_limit is not None and user_slot is None:
+            raise ValidationError('You have already used this coupon.')
+        if coupon.usage_limit is not None and slot is None:
+            raise ValidationError('This coupon has been fully redeemed.')
+        try:
+            with transaction.atomic():
+                return CouponRedemption.objects.create(
+                    coupon=coupon, user_id=order.owner_id, order=order, discount=order.discount,
+                    slot=slot, user_slot=user_slot
+                )
+        except IntegrityError:
+            # each conflict is a redemption another checkout committed, so this loop ends within the limit
+            claimed = slot, user_slot
+            if slot is not None:
+                slot = _free_slot(redemptions.values_list('slot', flat=True), coupon.usage_limit)
+            if user_slot is not None:
+                user_slot = _free_slot(user_redemptions.values_list('user_slot', flat=True), coupon.per_user_limit)
+            if (slot, user_slot) == claimed:
+                raise
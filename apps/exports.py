@@ -0,0 +1,101 @@
+import csv
+from datetime import datetime
+from tempfile import TemporaryFile
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
+from django.utils.timezone import localtime, now
+from openpyxl import Workbook
+
+from apps.models import Order, OrderItem, Product
+
+EXPORT_FOLDER = 'exports'
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_CHOICES = [
+    ('orders', 'Orders'),
+    ('order-items', 'Order items'),
+    ('products', 'Products'),
+]
+
+EXPORTS = {
+    'orders': (Order, 'created_at', [
+        ('ID', 'id'),
+        ('Created', 'created_at'),
+        ('Status', 'status'),
+        ('Payment method', 'payment_method'),
+        ('Customer', 'owner__email'),
+        ('Subtotal', 'subtotal'),
+        ('Discount', 'discount'),
+        ('Shipping cost', 'shipping_cost'),
+        ('Tax', 'tax'),
+        ('Total', 'total'),
+    ]),
+    'order-items': (OrderItem, 'order__created_at', [
+        ('ID', 'id'),
+        ('Order', 'order_id'),
+        ('Created', 'order__created_at'),
+        ('Product ID', 'product_id'),
+        ('Product', 'product__title'),
+        ('Quantity', 'quantity'),
+        ('Price', 'price'),
+        ('Discount %', 'discount_percent'),
+        ('Shipping cost', 'shipping_cost'),
+    ]),
+    'products': (Product, 'created_at', [
+        ('ID', 'id'),
+        ('Title', 'title'),
+        ('Category', 'category__name'),
+        ('Price', 'price'),
+        ('Discount %', 'discount_percent'),
+        ('Shipping cost', 'shipping_cost'),
+        ('Stock', 'stock'),
+        ('Reviews', 'review_count'),
+        ('Created', 'created_at'),
+    ]),
+}
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return localtime(value).replace(tzinfo=None)
+    return value
+
+
+def export_rows(name, date_from=None, date_to=None):
+    model, date_field, columns = EXPORTS[name]
+    queryset = model.objects.order_by('pk')
+    if date_from:
+        queryset = queryset.filter(**{f'{date_field}__date__gte': date_from})
+    if date_to:
+        queryset = queryset.filter(**{f'{date_field}__date__lte': date_to})
+
+    yield [header for header, _ in columns]
+    for row in queryset.values_list(*(field for _, field in columns)).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [_cell(value) for value in row]
+
+
+def csv_response(name, date_from=None, date_to=None):
+    writer = csv.writer(Echo())
+    rows = (writer.writerow(row) for row in export_rows(name, date_from, date_to))
+    response = StreamingHttpResponse(rows, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{name}.csv"'
+    return response
+
+
+def write_xlsx(name, date_from=None, date_to=None) -> str:
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(name)
+    for row in export_rows(name, date_from, date_to):
+        sheet.append(row)
+
+    with TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        return default_storage.save(f'{EXPORT_FOLDER}/{name}_{now():%Y%m%d_%H%M%S}.xlsx', File(f))
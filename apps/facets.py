@@ -0,0 +1,70 @@
+from django.db.models import BooleanField, Case, Count, IntegerField, Q, Value, When
+
+from apps.cache import get_category_index, get_category_tree
+from apps.models import Tag
+
+PRICE_BANDS = (
+    (0, 50),
+    (50, 100),
+    (100, 500),
+    (500, 1000),
+    (1000, None),
+)
+
+
+def price_band_q(index):
+    try:
+        low, high = PRICE_BANDS[int(index)]
+    except (ValueError, TypeError, IndexError):
+        return None
+    return Q(price__gte=low) & (Q(price__lt=high) if high is not None else Q())
+
+
+def price_band_label(low, high) -> str:
+    return f'${low} - ${high}' if high is not None else f'${low}+'
+
+
+def compute_facets(qs, category_slug=None, tags_limit=20):
+    rows = qs.order_by().annotate(
+        band=Case(
+            *(When(price_band_q(i), then=Value(i)) for i in range(len(PRICE_BANDS))),
+            output_field=IntegerField(),
+        ),
+        available=Case(When(stock__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField()),
+    ).values('category_id', 'band', 'available').annotate(count=Count('pk'))
+
+    bands = [0] * len(PRICE_BANDS)
+    stock = {True: 0, False: 0}
+    categories = {}
+    for row in rows:
+        bands[row['band']] += row['count']
+        stock[row['available']] += row['count']
+        categories[row['category_id']] = categories.get(row['category_id'], 0) + row['count']
+
+    index = get_category_index()
+    selected = index.get(category_slug)
+    children = selected['children'] if selected else get_category_tree()
+    category_facets = []
+    for child in children:
+        count = sum(
+            n for category_id, n in categories.items()
+            if category_id in index and index[category_id]['tree_id'] == child['tree_id']
+            and child['lft'] <= index[category_id]['lft'] and index[category_id]['rght'] <= child['rght']
+        )
+        if count:
+            category_facets.append({'name': child['name'], 'slug': child['slug'], 'count': count})
+
+    tags = Tag.objects.filter(product__in=qs.order_by().values('pk')).annotate(
+        count=Count('product')
+    ).order_by('-count', 'name').values('name', 'slug', 'count')[:tags_limit]
+
+    return {
+        'categories': category_facets,
+        'price': [
+            {'index': i, 'label': price_band_label(*PRICE_BANDS[i]), 'count': count}
+            for i, count in enumerate(bands) if count
+        ],
+        'in_stock': stock[True],
+        'out_of_stock': stock[False],
+        'tags': list(tags),
+    }
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.models.products import Favorite
+
+FAVORITES = 'favorites'
+
+
+def _key(user_id):
+    return f'{FAVORITES}:{user_id}'
+
+
+def get_favorite_ids(user_id) -> set:
+    key = _key(user_id)
+    favorite_ids = cache.get(key)
+    if favorite_ids is None:
+        favorite_ids = set(Favorite.objects.filter(user_id=user_id).values_list('product_id', flat=True))
+        cache.set(key, favorite_ids, settings.FAVORITES_CACHE_TIMEOUT)
+    return favorite_ids
+
+
+def set_favorite(user_id, product_id, liked):
+    # always write through to the database: deciding from a cached snapshot drops concurrent toggles
+    if liked:
+        Favorite.objects.bulk_create([Favorite(user_id=user_id, product_id=product_id)], ignore_conflicts=True)
+    else:
+        Favorite.objects.filter(user_id=user_id, product_id=product_id).delete()
+    cache.delete(_key(user_id))
+    return get_favorite_ids(user_id)
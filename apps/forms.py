@@ -2,11 +2,18 @@ from datetime import datetime
 
 from django.contrib.auth.forms import AuthenticationForm
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
 from django.forms import ModelForm, CharField, ModelChoiceField
 from django_recaptcha.fields import ReCaptchaField
 
+from apps.cache import load_tax_percent
+from apps.cart import cart_changed
+from apps.coupons import check_coupon, reserve_coupon, release_coupon, redeem_coupon
 from apps.models import Address, Order, CreditCard, OrderItem, User
-from apps.models.products import Review, CartItem
+from apps.models.products import Review, CartItem, Product
+from apps.reservations import hold_stock, release_hold
+from apps.tasks import generate_invoice
 
 
 class RecaptchaForm(AuthenticationForm):
@@ -54,6 +61,7 @@ class AddressForm(ModelForm):
 class OrderCreateModelForm(ModelForm):
     address = ModelChoiceField(queryset=Address.objects.all())
     owner = ModelChoiceField(queryset=User.objects.all(), required=False)
+    coupon = CharField(max_length=50, required=False)
 
     class Meta:
         model = Order
@@ -70,28 +78,61 @@ class OrderCreateModelForm(ModelForm):
             obj.owner = self.request.user
 
         if commit:
-            obj.save()
-
-            if obj.payment_method == 'credit_card':
-                cvv = self.data.get('cvv')
-                month, year = map(int, self.data.get('expire_date').split('/'))
-                expire_date = datetime(year + 2000, month, 1).date()
-                number = self.data.get('number')
-                CreditCard.objects.create(
-                    owner=obj.owner,
-                    order=obj,
-                    cvv=cvv,
-                    expire_date=expire_date,
-                    number=number
-                )
-
-            for cart_item in obj.owner.cart_items.all():
-                OrderItem.objects.create(
-                    order=obj,
-                    quantity=cart_item.quantity,
-                    product=cart_item.product
-                )
-
-            CartItem.objects.filter(user=obj.owner).delete()
+            coupon = check_coupon(self.cleaned_data['coupon'], obj.owner.pk) if self.cleaned_data['coupon'] else None
+            reserved_coupon, slot = reserve_coupon(coupon, obj.owner.pk) if coupon else ([], None)
+            try:
+                self._place_order(obj, coupon, slot)
+            except Exception:
+                release_coupon(reserved_coupon)
+                raise
+            release_hold(obj.owner.pk)
+            cart_changed(obj.owner.pk)
 
         return obj
+
+    @transaction.atomic
+    def _place_order(self, obj: Order, coupon, coupon_slot=None):
+        cart_items = CartItem.objects.filter(user=obj.owner).select_related('product').defer(
+            'product__search_vector'
+        ).order_by('product_id')
+        hold_stock(obj.owner.pk, cart_items)
+        # one conditional UPDATE for the whole cart; a short line leaves fewer rows updated and rolls it back
+        quantities = {cart_item.product_id: cart_item.quantity for cart_item in cart_items}
+        needed = Case(*(When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()),
+                      output_field=IntegerField())
+        with transaction.atomic():
+            reserved = Product.objects.filter(pk__in=quantities, stock__gte=needed).update(stock=F('stock') - needed)
+            if reserved != len(quantities):
+                transaction.set_rollback(True)
+        if reserved != len(quantities):
+            title = Product.objects.filter(pk__in=quantities, stock__lt=needed).values_list('title', flat=True).first()
+            raise ValidationError(f'Not enough "{title}" in stock.')
+
+        order_items = []
+        for cart_item in cart_items:
+            order_item = OrderItem(order=obj, quantity=cart_item.quantity, product=cart_item.product)
+            order_item.snapshot_product(cart_item.product)
+            order_items.append(order_item)
+
+        obj.calculate_totals(order_items, load_tax_percent(), coupon.discount_amount if coupon else 0)
+        obj.save()
+
+        if obj.payment_method == 'credit_card':
+            cvv = self.data.get('cvv')
+            month, year = map(int, self.data.get('expire_date').split('/'))
+            expire_date = datetime(year + 2000, month, 1).date()
+            number = self.data.get('number')
+            CreditCard.objects.create(
+                owner=obj.owner,
+                order=obj,
+                cvv=cvv,
+                expire_date=expire_date,
+                number=number
+            )
+
+        OrderItem.objects.bulk_create(order_items)
+        transaction.on_commit(lambda: generate_invoice.delay(obj.pk))
+        if coupon:
+            redeem_coupon(coupon, obj, coupon_slot)
+
+        CartItem.objects.filter(user=obj.owner).delete()
@@ -0,0 +1,49 @@
+import os.path
+from io import BytesIO
+
+from PIL import Image
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def derivative_name(name, width, fmt) -> str:
+    directory, filename = os.path.split(name)
+    return os.path.join('derivatives', directory, f'{os.path.splitext(filename)[0]}_{width}.{fmt}')
+
+
+def render_derivatives(name):
+    with default_storage.open(name, 'rb') as f:
+        original = Image.open(f)
+        original.load()
+
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+
+    derivatives = {}
+    for width in settings.PRODUCT_IMAGE_WIDTHS:
+        resized = original.copy()
+        resized.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+        for fmt, (pil_format, options) in FORMATS.items():
+            image = resized.convert('RGB') if pil_format == 'JPEG' else resized
+            buffer = BytesIO()
+            image.save(buffer, pil_format, **options)
+
+            path = derivative_name(name, width, fmt)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            derivatives[f'{width}.{fmt}'] = default_storage.save(path, ContentFile(buffer.getvalue()))
+    return derivatives
+
+
+def backfill_worker(item):
+    pk, name = item
+    try:
+        return pk, render_derivatives(name), None
+    except Exception as e:
+        return pk, None, str(e)
@@ -0,0 +1,179 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator
+from django.db import transaction
+
+from apps.cache import invalidate_catalog
+from apps.cart import invalidate_cart_summaries
+from apps.models import Product, Category, Tag
+from apps.search import index_products
+from apps.specifications import sync_specifications
+
+IMPORT_BATCH_SIZE = 1000
+LIST_SEPARATOR = '|'
+
+# columns whose database limits (length, sign, check constraints) would otherwise fail the whole batch
+VALIDATED_FIELDS = ['sku', 'title', 'short_description', 'price', 'discount_percent', 'shipping_cost', 'stock']
+EXTRA_VALIDATORS = {'discount_percent': [MaxValueValidator(100)]}
+
+PRODUCT_FIELDS = [
+    'title', 'short_description', 'long_description', 'price', 'discount_percent', 'shipping_cost', 'stock',
+    'is_premium', 'specification', 'category', 'updated_at',
+]
+
+
+def read_feed(f):
+    first = f.readline()
+    if first.lstrip().startswith('{'):
+        yield json.loads(first)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    header = next(csv.reader([first]))
+    yield from csv.DictReader(f, fieldnames=header)
+
+
+def _split(value):
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in (value or '').split(LIST_SEPARATOR) if item.strip()]
+
+
+def _flag(value) -> bool:
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+class NameMap:
+    def __init__(self, model, bulk=False):
+        self.model = model
+        self.bulk = bulk
+        self.ids = {name.lower(): pk for name, pk in model.objects.values_list('name', 'pk')}
+
+    def create(self, names):
+        if self.bulk:
+            return self.model.bulk_create_with_slugs([self.model(name=name) for name in names])
+        return [self.model.objects.create(name=name) for name in names]
+
+    def resolve(self, names):
+        missing = {name.lower(): name for name in names if name.lower() not in self.ids}
+        if missing:
+            for obj in self.create(missing.values()):
+                self.ids[obj.name.lower()] = obj.pk
+        return [self.ids[name.lower()] for name in names]
+
+
+def queue_image_downloads(images):
+    from apps.tasks import download_product_image
+
+    for product_id, url in images:
+        download_product_image.delay(product_id, url)
+
+
+def validate_product(product: Product):
+    errors = {}
+    for name in VALIDATED_FIELDS:
+        field = Product._meta.get_field(name)
+        value = getattr(product, name)
+        try:
+            field.run_validators(value)
+            for validator in EXTRA_VALIDATORS.get(name, []):
+                validator(value)
+        except ValidationError as e:
+            errors[name] = e.messages
+    if errors:
+        raise ValidationError(errors)
+
+
+def build_product(row, categories: NameMap):
+    sku = str(row.get('sku') or '').strip()
+    if not sku:
+        raise ValueError('sku is required')
+    specification = row.get('specification') or {}
+    if isinstance(specification, str):
+        specification = json.loads(specification)
+    category = (row.get('category') or '').strip()
+    if not category:
+        raise ValueError('category is required')
+
+    product = Product(
+        sku=sku,
+        title=row['title'],
+        short_description=row.get('short_description') or '',
+        long_description=row.get('long_description') or '',
+        price=int(row['price']),
+        discount_percent=int(row.get('discount_percent') or 0),
+        shipping_cost=int(row.get('shipping_cost') or 0),
+        stock=int(row.get('stock') or 0),
+        is_premium=_flag(row.get('is_premium')),
+        specification=specification,
+    )
+    validate_product(product)
+    product.category_id = categories.resolve([category])[0]
+    return product
+
+
+def _import_batch(rows, categories: NameMap, tags: NameMap, stats, errors):
+    products, product_tags, images = [], {}, []
+    for line, row in rows:
+        try:
+            product = build_product(row, categories)
+        except (KeyError, ValueError, TypeError, ValidationError) as e:
+            errors.append((line, f'{e.__class__.__name__}: {e}'))
+            continue
+        products.append(product)
+        product_tags[product.sku] = tags.resolve(_split(row.get('tags')))
+        images.extend((product.sku, url) for url in _split(row.get('images')))
+
+    products = list({product.sku: product for product in products}.values())
+    existing = set(Product.objects.filter(sku__in=[product.sku for product in products]).values_list('sku', flat=True))
+
+    with transaction.atomic():
+        Product.objects.bulk_create(
+            products, batch_size=IMPORT_BATCH_SIZE,
+            update_conflicts=True, unique_fields=['sku'], update_fields=PRODUCT_FIELDS
+        )
+
+        through = Product.tags.through
+        through.objects.filter(product_id__in=[product.pk for product in products if product.sku in existing]).delete()
+        through.objects.bulk_create([
+            through(product_id=product.pk, tag_id=tag_id)
+            for product in products
+            for tag_id in product_tags[product.sku]
+        ], batch_size=IMPORT_BATCH_SIZE, ignore_conflicts=True)
+
+        sync_specifications(products)
+        index_products(products)
+
+        ids = {product.sku: product.pk for product in products}
+        transaction.on_commit(lambda: queue_image_downloads([(ids[sku], url) for sku, url in images]))
+
+    stats['created'] += len(products) - len(existing)
+    stats['updated'] += len(existing)
+    stats['images'] += len(images)
+
+
+def import_products(rows, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    categories, tags = NameMap(Category), NameMap(Tag, bulk=True)
+    stats = {'rows': 0, 'created': 0, 'updated': 0, 'images': 0, 'failed': 0, 'seconds': 0, 'rows_per_second': 0}
+    errors = []
+    started = time.monotonic()
+
+    rows = enumerate(rows, 1)
+    while batch := list(islice(rows, batch_size)):
+        _import_batch(batch, categories, tags, stats, errors)
+        stats['rows'] += len(batch)
+        stats['failed'] = len(errors)
+        stats['seconds'] = time.monotonic() - started
+        stats['rows_per_second'] = stats['rows'] / max(stats['seconds'], 1e-9)
+        if progress:
+            progress(stats)
+
+    invalidate_catalog()
+    invalidate_cart_summaries()
+    return stats, errors
@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from apps.cache import load_tax_percent
+from apps.models import Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = 'Store price snapshots and totals on orders placed before they were recorded at checkout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        tax_percent = load_tax_percent()
+        orders = Order.objects.filter(total=0).order_by('pk')
+
+        last_pk = done = 0
+        while batch := list(orders.filter(pk__gt=last_pk)[:options['batch_size']]):
+            last_pk = batch[-1].pk
+
+            items = defaultdict(list)
+            order_items = list(OrderItem.objects.filter(order__in=batch).select_related('product').defer(
+                'product__search_vector'
+            ))
+            for order_item in order_items:
+                if not order_item.price:
+                    order_item.snapshot_product(order_item.product)
+                items[order_item.order_id].append(order_item)
+            for order in batch:
+                order.calculate_totals(items[order.pk], tax_percent)
+
+            with transaction.atomic():
+                OrderItem.objects.bulk_update(order_items, ['price', 'discount_percent', 'shipping_cost'])
+                Order.objects.bulk_update(batch, ['subtotal', 'shipping_cost', 'tax_percent', 'tax', 'total'])
+            done += len(batch)
+            self.stdout.write(f'{done} orders processed')
+
+        self.stdout.write(self.style.SUCCESS(f'{done} orders backfilled'))
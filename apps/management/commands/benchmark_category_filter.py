@@ -0,0 +1,24 @@
+from django.core.management import BaseCommand
+
+from apps.benchmarks import benchmark_category_filter
+
+
+class Command(BaseCommand):
+    help = 'Compare the MPTT range filter with expanding descendants in Python on a synthetic category tree'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10_000)
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--fanout', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"category":<16}{"descendants":>12}{"products":>10}{"range ms":>11}{"expansion ms":>14}')
+        for row in benchmark_category_filter(
+                options['categories'], options['products'], options['fanout'], options['repeat']
+        ):
+            self.stdout.write(
+                f'{row["category"]:<16}{row["descendants"]:>12}{row["products"]:>10}'
+                f'{row["range_ms"]:>11.1f}{row["expansion_ms"]:>14.1f}'
+            )
+        self.stdout.write(self.style.SUCCESS('Synthetic data rolled back'))
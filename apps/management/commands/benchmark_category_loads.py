@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand, CommandError
+
+from apps.benchmarks import benchmark_category_loads
+
+
+class Command(BaseCommand):
+    help = 'Compare per-row category inserts with deferred tree updates and one rebuild'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1500, 3000])
+        parser.add_argument('--fanout', type=int, default=10)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"categories":>10}{"per row s":>11}{"nodes/s":>9}{"deferred s":>12}{"nodes/s":>9}')
+        for row in benchmark_category_loads(options['sizes'], options['fanout']):
+            if row['errors']:
+                raise CommandError(f'deferred load left {row["errors"]} tree errors')
+            self.stdout.write(
+                f'{row["size"]:>10}{row["per_row_s"]:>11.2f}{row["size"] / row["per_row_s"]:>9.0f}'
+                f'{row["deferred_s"]:>12.2f}{row["size"] / row["deferred_s"]:>9.0f}'
+            )
+        self.stdout.write(self.style.SUCCESS('Synthetic data rolled back'))
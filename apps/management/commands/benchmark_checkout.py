@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+
+from apps.benchmarks import benchmark_checkout
+
+
+class Command(BaseCommand):
+    help = 'Compare the atomic bulk checkout with the per-row order item inserts it replaced'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200)
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 10, 25])
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"lines":>6}{"per row orders/s":>18}{"queries":>9}{"bulk orders/s":>15}{"queries":>9}')
+        for row in benchmark_checkout(options['orders'], options['lines']):
+            self.stdout.write(
+                f'{row["lines"]:>6}{row["per_row_orders_per_s"]:>18.0f}{row["per_row_queries"]:>9.1f}'
+                f'{row["bulk_orders_per_s"]:>15.0f}{row["bulk_queries"]:>9.1f}'
+            )
+        self.stdout.write(self.style.SUCCESS('Synthetic data rolled back'))
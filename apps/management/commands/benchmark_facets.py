@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+
+from apps.benchmarks import benchmark_facets
+
+
+class Command(BaseCommand):
+    help = 'Time the single-pass facet counts against per-facet COUNT queries on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--categories', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"case":<28}{"products":>10}{"single pass ms":>16}{"per query ms":>14}')
+        for row in benchmark_facets(options['products'], options['categories'], options['tags'], options['repeat']):
+            self.stdout.write(
+                f'{row["case"]:<28}{row["products"]:>10}{row["single_pass_ms"]:>16.1f}{row["per_query_ms"]:>14.1f}'
+            )
+        self.stdout.write(self.style.SUCCESS('Synthetic data rolled back'))
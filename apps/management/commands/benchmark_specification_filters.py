@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+
+from apps.benchmarks import benchmark_specification_filters
+
+
+class Command(BaseCommand):
+    help = 'Time spec.* filters while a synthetic catalog grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--matches', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"products":>10}  {"filter":<34}{"matches":>9}{"page ms":>10}{"count ms":>10}')
+        for row in benchmark_specification_filters(options['sizes'], options['matches'], options['repeat']):
+            self.stdout.write(
+                f'{row["size"]:>10}  {row["filter"]:<34}{row["matches"]:>9}'
+                f'{row["page_ms"]:>10.1f}{row["count_ms"]:>10.1f}'
+            )
+        self.stdout.write(self.style.SUCCESS('Synthetic data rolled back'))
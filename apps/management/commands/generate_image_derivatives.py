@@ -0,0 +1,46 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management import BaseCommand
+from django.db import connections
+
+from apps.cache import invalidate_catalog
+from apps.images import backfill_worker
+from apps.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG derivatives for existing product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true', help='Regenerate images that already have derivatives')
+
+    def handle(self, *args, **options):
+        qs = ProductImage.objects.exclude(image='')
+        if not options['all']:
+            qs = qs.filter(derivatives={})
+        items = list(qs.values_list('pk', 'image'))
+        if not items:
+            self.stdout.write('Nothing to do')
+            return
+
+        connections.close_all()
+        done = failed = 0
+        batch = []
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+            for pk, derivatives, error in executor.map(backfill_worker, items, chunksize=16):
+                if error:
+                    failed += 1
+                    self.stderr.write(f'Image {pk}: {error}')
+                    continue
+                batch.append(ProductImage(pk=pk, derivatives=derivatives))
+                done += 1
+                if len(batch) >= options['batch_size']:
+                    ProductImage.objects.bulk_update(batch, ['derivatives'])
+                    batch = []
+                    self.stdout.write(f'{done}/{len(items)} images processed')
+        ProductImage.objects.bulk_update(batch, ['derivatives'])
+        invalidate_catalog()
+        self.stdout.write(self.style.SUCCESS(f'{done} images processed, {failed} failed'))
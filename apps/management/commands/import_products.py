@@ -0,0 +1,33 @@
+from django.core.management import BaseCommand
+
+from apps.importer import import_products, read_feed, IMPORT_BATCH_SIZE
+from apps.tasks import import_product_feed
+
+
+class Command(BaseCommand):
+    help = 'Bulk import products from a CSV or JSON lines supplier feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file; with --async, a path in the default storage')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--async', action='store_true', dest='run_async', help='Run the import in a Celery task')
+
+    def handle(self, *args, **options):
+        if options['run_async']:
+            result = import_product_feed.delay(options['path'], options['batch_size'])
+            self.stdout.write(f'Import queued: {result.id}')
+            return
+
+        with open(options['path'], encoding='utf-8', newline='') as f:
+            stats, errors = import_products(read_feed(f), options['batch_size'], self.progress)
+
+        for line, error in errors:
+            self.stderr.write(f'Row {line}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['rows']} rows in {stats['seconds']:.1f}s ({stats['rows_per_second']:.0f} rows/s): "
+            f"{stats['created']} created, {stats['updated']} updated, {stats['failed']} failed, "
+            f"{stats['images']} images queued"
+        ))
+
+    def progress(self, stats):
+        self.stdout.write(f"{stats['rows']} rows, {stats['rows_per_second']:.0f} rows/s")
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.cache import invalidate_category_tree, invalidate_catalog
+from apps.categories import find_tree_errors, rebuild_category_tree
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the category MPTT fields from parent links and validate the tree'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only validate the tree, do not rebuild it')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            started = time.monotonic()
+            with transaction.atomic():
+                updated = rebuild_category_tree()
+            invalidate_category_tree()
+            invalidate_catalog()
+            self.stdout.write(f'{updated} categories updated in {time.monotonic() - started:.2f}s')
+
+        errors = find_tree_errors()
+        for error in errors[:50]:
+            self.stderr.write(error)
+        if errors:
+            raise CommandError(f'{len(errors)} tree errors found')
+        self.stdout.write(self.style.SUCCESS('Category tree is valid'))
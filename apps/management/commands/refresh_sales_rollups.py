@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from apps.analytics import refresh_daily_sales
+
+
+class Command(BaseCommand):
+    help = 'Refresh the daily sales rollups for orders changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild the rollups for every order')
+
+    def handle(self, *args, **options):
+        days, rows = refresh_daily_sales(options['full'])
+        self.stdout.write(self.style.SUCCESS(f'{days} days refreshed, {rows} product rows written'))
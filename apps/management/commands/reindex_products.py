@@ -0,0 +1,24 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from apps.models import Product
+from apps.search import ensure_search_index, index_product
+from apps.specifications import sync_specification
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index and specification filters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        ensure_search_index()
+        count = 0
+        products = Product.objects.only('title', 'short_description', 'long_description', 'specification')
+        with transaction.atomic():
+            for product in products.iterator(chunk_size=options['chunk_size']):
+                index_product(product)
+                sync_specification(product)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'{count} products indexed'))
@@ -1,3 +1,4 @@
-from apps.models.products import Product, Category, ProductImage, Tag
+from apps.models.products import Product, Category, ProductImage, Tag, ProductSpecification
 from apps.models.user import User, SiteSettings, CreditCard, Address
 from apps.models.orders import Order, OrderItem
+from apps.models.analytics import DailySales, DailySalesTotal, RollupWatermark
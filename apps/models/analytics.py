@@ -0,0 +1,34 @@
+from django.db.models import Model, ForeignKey, SET_NULL, DateField, PositiveIntegerField, CharField, \
+    DateTimeField, UniqueConstraint, Index
+
+
+class DailySales(Model):
+    day = DateField()
+    product = ForeignKey('apps.Product', SET_NULL, null=True)
+    category = ForeignKey('apps.Category', SET_NULL, null=True)
+    units = PositiveIntegerField(default=0)
+    revenue = PositiveIntegerField(default=0)
+    orders = PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['day', 'product'], name='daily_sales_day_product'),
+        ]
+        indexes = [
+            Index(fields=['day', 'category'], name='daily_sales_day_category_idx'),
+        ]
+
+
+class DailySalesTotal(Model):
+    day = DateField(unique=True)
+    units = PositiveIntegerField(default=0)
+    revenue = PositiveIntegerField(default=0)
+    orders = PositiveIntegerField(default=0)
+
+
+class RollupWatermark(Model):
+    name = CharField(max_length=100, unique=True)
+    value = DateTimeField()
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
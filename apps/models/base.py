@@ -1,20 +1,88 @@
-from django.db.models import CharField, Model, SlugField, DateTimeField
+import re
+
+from django.db import IntegrityError, transaction, router
+from django.db.models import CharField, Model, SlugField, DateTimeField, Q
 from django.utils.text import slugify
 
+SLUG_MAX_LENGTH = 255
+SLUG_RETRIES = 5
+
+
+def slug_base(name, default='item') -> str:
+    # leave room for a "-<n>" suffix so allocated slugs never exceed the column
+    return slugify(name)[:SLUG_MAX_LENGTH - 11].strip('-') or default
+
+
+def slug_matches(base, slug) -> bool:
+    return slug == base or re.fullmatch(rf'{re.escape(base)}-\d+', slug) is not None
+
+
+def next_slug(base, taken) -> str:
+    suffixes = {0 if slug == base else int(slug[len(base) + 1:]) for slug in taken if slug_matches(base, slug)}
+    if 0 not in suffixes:
+        return base
+    return f'{base}-{max(suffixes) + 1}'
+
 
 class SlugBaseModel(Model):
     name = CharField(max_length=255)
-    slug = SlugField(max_length=255, unique=True, editable=False)
+    slug = SlugField(max_length=SLUG_MAX_LENGTH, unique=True, editable=False)
 
     class Meta:
         abstract = True
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        self.slug = slugify(self.name)
-        while self.__class__.objects.filter(slug=self.slug).exists():
-            self.slug += '-1'
+    @classmethod
+    def taken_slugs(cls, bases, using=None, exclude_pk=None):
+        query = Q()
+        for base in set(bases):
+            query |= Q(slug=base) | Q(slug__startswith=f'{base}-')
+        qs = cls._default_manager.using(using).filter(query)
+        if exclude_pk is not None:
+            qs = qs.exclude(pk=exclude_pk)
+        return set(qs.values_list('slug', flat=True))
+
+    @classmethod
+    def allocate_slugs(cls, objs, using=None):
+        objs = list(objs)
+        taken = cls.taken_slugs([obj.get_slug_base() for obj in objs], using)
+        for obj in objs:
+            obj.slug = next_slug(obj.get_slug_base(), taken)
+            taken.add(obj.slug)
+        return objs
+
+    @classmethod
+    def bulk_create_with_slugs(cls, objs, batch_size=None, using=None):
+        using = using or router.db_for_write(cls)
+        for attempt in range(SLUG_RETRIES):
+            cls.allocate_slugs(objs, using)
+            try:
+                with transaction.atomic(using=using):
+                    return cls._default_manager.using(using).bulk_create(objs, batch_size=batch_size)
+            except IntegrityError:
+                if attempt == SLUG_RETRIES - 1:
+                    raise
+
+    def get_slug_base(self) -> str:
+        return slug_base(self.name, self._meta.model_name)
 
-        super().save(force_insert, force_update, using, update_fields)
+    def allocate_slug(self, using=None):
+        base = self.get_slug_base()
+        if self.slug and slug_matches(base, self.slug):
+            return self.slug
+        return next_slug(base, self.taken_slugs([base], using, self.pk))
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        using = using or router.db_for_write(self.__class__, instance=self)
+        for attempt in range(SLUG_RETRIES):
+            self.slug = self.allocate_slug(using)
+            try:
+                with transaction.atomic(using=using):
+                    return super().save(force_insert, force_update, using, update_fields)
+            except IntegrityError:
+                conflict = self.__class__._default_manager.using(using).filter(slug=self.slug).exclude(pk=self.pk)
+                if attempt == SLUG_RETRIES - 1 or not conflict.exists():
+                    raise
+                self.slug = ''
 
     def __str__(self):
         return self.name
@@ -25,4 +93,4 @@ class CreatedBaseModel(Model):
     created_at = DateTimeField(auto_now_add=True)
 
     class Meta:
-        abstract = True
\ No newline at end of file
+        abstract = True
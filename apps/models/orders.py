@@ -1,7 +1,8 @@
 from django.db.models import Model, TextChoices, CharField, ForeignKey, CASCADE, PositiveIntegerField, \
-    FileField, F, Sum
+    FileField, FloatField
 
 from apps.models.base import CreatedBaseModel
+from apps.pricing import calculate, line_amount, unit_price
 
 
 class Order(CreatedBaseModel):
@@ -20,24 +21,46 @@ class Order(CreatedBaseModel):
     payment_method = CharField(max_length=255, choices=PaymentMethod.choices)
     address = ForeignKey('apps.Address', CASCADE)
     owner = ForeignKey('apps.User', CASCADE, related_name='orders')
-    pdf_file = FileField()
+    pdf_file = FileField(blank=True)
+    pdf_hash = CharField(max_length=64, blank=True, editable=False)
+    subtotal = PositiveIntegerField(default=0, db_default=0, editable=False)
+    shipping_cost = PositiveIntegerField(default=0, db_default=0, editable=False)
+    discount = PositiveIntegerField(default=0, db_default=0, editable=False)
+    tax_percent = FloatField(default=0, db_default=0, editable=False)
+    tax = PositiveIntegerField(default=0, db_default=0, editable=False)
+    total = PositiveIntegerField(default=0, db_default=0, editable=False)
 
     def __str__(self):
         return f'Order {self.id} - {self.status}'
 
-    @property
-    def total(self):
-        return self.orderitem_set.aggregate(
-            total=Sum(F('quantity') * (F('product__price') * (
-                    100 - F('product__discount_percent')) / 100)) + Sum(F('product__shipping_cost'))
-        )
+    def calculate_totals(self, items, tax_percent, discount=0):
+        totals = calculate(((item.quantity, item.price, item.discount_percent, item.shipping_cost) for item in items),
+                           tax_percent, discount)
+        self.subtotal = totals['subtotal']
+        self.shipping_cost = totals['shipping_cost']
+        self.discount = totals['discount']
+        self.tax_percent = totals['tax_percent']
+        self.tax = totals['tax']
+        self.total = totals['total']
 
 
 class OrderItem(Model):
     product = ForeignKey('Product', CASCADE)
     order = ForeignKey('Order', CASCADE)
     quantity = PositiveIntegerField(default=1)
+    price = PositiveIntegerField(default=0, db_default=0)
+    discount_percent = PositiveIntegerField(default=0, db_default=0)
+    shipping_cost = PositiveIntegerField(default=0, db_default=0)
+
+    def snapshot_product(self, product):
+        self.price = product.price
+        self.discount_percent = product.discount_percent
+        self.shipping_cost = product.shipping_cost
+
+    @property
+    def unit_price(self):
+        return unit_price(self.price, self.discount_percent)
 
     @property
     def amount(self):
-        return self.quantity * self.product.current_price
+        return line_amount(self.quantity, self.price, self.discount_percent)
@@ -1,8 +1,10 @@
 from datetime import timedelta
 
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.db.models import CASCADE, Model, CharField, IntegerField, PositiveIntegerField, ManyToManyField, JSONField, \
     ForeignKey, DateTimeField, ImageField, EmailField, TextField, DateField, DecimalField, \
-    BooleanField, CheckConstraint, Q
+    BooleanField, CheckConstraint, Q, Index, UniqueConstraint, URLField
 from django.utils.timezone import now
 from django_ckeditor_5.fields import CKEditor5Field
 from mptt.fields import TreeForeignKey
@@ -10,11 +12,17 @@ from mptt.models import MPTTModel
 
 from apps.models.base import SlugBaseModel
 from apps.models.user import User
+from apps.pricing import unit_price
 
 
 class Category(SlugBaseModel, MPTTModel):
     parent = TreeForeignKey('self', CASCADE, null=True, blank=True, related_name='children')
 
+    class Meta:
+        indexes = [
+            Index(fields=['tree_id', 'lft', 'rght'], name='category_tree_range_idx'),
+        ]
+
     class MPTTMeta:
         order_insertion_by = ['name']
 
@@ -23,7 +31,11 @@ class Tag(SlugBaseModel):
     pass
 
 
+RATING_FIELDS = ('review_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+
+
 class Product(Model):
+    sku = CharField(max_length=64, unique=True, null=True, blank=True)
     title = CharField(max_length=255)
     short_description = CharField(max_length=255)
     price = PositiveIntegerField()
@@ -35,10 +47,21 @@ class Product(Model):
     specification = JSONField(default=dict)
     category = ForeignKey('Category', CASCADE, related_name="products")
     is_premium = BooleanField(db_default=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+    review_count = PositiveIntegerField(default=0, db_default=0, editable=False)
+    rating_sum = PositiveIntegerField(default=0, db_default=0, editable=False)
+    rating_1 = PositiveIntegerField(default=0, db_default=0, editable=False)
+    rating_2 = PositiveIntegerField(default=0, db_default=0, editable=False)
+    rating_3 = PositiveIntegerField(default=0, db_default=0, editable=False)
+    rating_4 = PositiveIntegerField(default=0, db_default=0, editable=False)
+    rating_5 = PositiveIntegerField(default=0, db_default=0, editable=False)
     updated_at = DateTimeField(auto_now=True)
     created_at = DateTimeField(auto_now_add=True)
 
     class Meta:
+        indexes = [
+            Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+        ]
         constraints = [
             CheckConstraint(
                 check=Q(discount_percent__lte=100),
@@ -46,14 +69,25 @@ class Product(Model):
             )
         ]
 
+    def save(self, *args, **kwargs):
+        # review aggregates are maintained with F() updates by the review signals; a full save of a stale
+        # instance must not write them back. Deferred fields (the search vector) are left alone as well.
+        if not self._state.adding and not args and kwargs.get('update_fields') is None \
+                and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in RATING_FIELDS and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def is_new(self) -> bool:
         return self.created_at >= now() - timedelta(days=7)
 
     @property
     def current_price(self):
-        # return self.price - self.price * self.discount_percent // 100
-        return self.price * (100 - self.discount_percent) // 100
+        return unit_price(self.price, self.discount_percent)
 
     def __str__(self):
         return self.title
@@ -62,18 +96,72 @@ class Product(Model):
     def in_stock(self) -> bool:
         return self.stock > 0
 
+    @property
+    def rating_average(self) -> float:
+        if not self.review_count:
+            return 0
+        return round(self.rating_sum / self.review_count, 1)
+
+    @property
+    def rating_stars(self):
+        average = self.rating_average
+        return ['full' if star <= average else 'half' if star - 0.5 <= average else 'empty' for star in range(1, 6)]
+
+    @property
+    def rating_histogram(self):
+        return [(star, getattr(self, f'rating_{star}')) for star in range(5, 0, -1)]
+
     # @property
     # def count_review(self):
     #     return self.product_reviews.count()
 
 
+class ProductSpecification(Model):
+    product = ForeignKey('Product', CASCADE, related_name='specification_values')
+    key = CharField(max_length=100)
+    value = CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            Index(fields=['key', 'value', 'product'], name='product_spec_lookup_idx'),
+        ]
+        constraints = [
+            UniqueConstraint(fields=['product', 'key'], name='product_spec_unique_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.key}={self.value}'
+
+
 class ProductImage(Model):
     image = ImageField(upload_to='products/%Y/%m/%d/')
     product = ForeignKey('Product', CASCADE, related_name='images')
+    derivatives = JSONField(default=dict, blank=True, editable=False)
+    source_url = URLField(max_length=500, blank=True, editable=False)
 
     def __str__(self):
         return f"Image for {self.product.title}"
 
+    def _srcset(self, fmt):
+        return ', '.join(
+            f'{self.image.storage.url(name)} {key.split(".")[0]}w'
+            for key, name in sorted(self.derivatives.items(), key=lambda item: int(item[0].split('.')[0]))
+            if key.endswith(f'.{fmt}')
+        )
+
+    @property
+    def webp_srcset(self):
+        return self._srcset('webp')
+
+    @property
+    def jpeg_srcset(self):
+        return self._srcset('jpeg')
+
+    @property
+    def thumbnail_url(self):
+        name = self.derivatives.get(f'{min(settings.PRODUCT_IMAGE_WIDTHS)}.jpeg')
+        return self.image.storage.url(name) if name else None
+
 
 class Review(Model):
     RATINGS = (
@@ -103,6 +191,11 @@ class CartItem(Model):
     user = ForeignKey('apps.User', CASCADE, related_name='cart_items')
     quantity = PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['user', 'product'], name='cart_item_unique_product'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product}"
 
@@ -121,9 +214,32 @@ class Favorite(Model):
 
 
 class Coupon(Model):
-    code = CharField(max_length=50)
+    code = CharField(max_length=50, unique=True)
     discount_amount = DecimalField(max_digits=10, decimal_places=2)
     active = BooleanField(default=True)
+    usage_limit = PositiveIntegerField(null=True, blank=True)
+    per_user_limit = PositiveIntegerField(null=True, blank=True)
+    valid_from = DateTimeField(null=True, blank=True)
+    valid_until = DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.code
+
+
+class CouponRedemption(Model):
+    coupon = ForeignKey(Coupon, CASCADE, related_name='redemptions')
+    user = ForeignKey(User, CASCADE, related_name='coupon_redemptions')
+    order = ForeignKey('apps.Order', CASCADE, null=True, blank=True)
+    discount = PositiveIntegerField(default=0)
+    slot = PositiveIntegerField(null=True, editable=False)
+    user_slot = PositiveIntegerField(null=True, editable=False)
+    created_at = DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            Index(fields=['coupon', 'user'], name='coupon_redemption_user_idx'),
+        ]
+        constraints = [
+            UniqueConstraint(fields=['coupon', 'slot'], name='coupon_redemption_slot'),
+            UniqueConstraint(fields=['coupon', 'user', 'user_slot'], name='coupon_redemption_user_slot'),
+        ]
@@ -12,7 +12,8 @@ class User(AbstractUser):
 
     @property
     def cart_count(self):
-        return self.cart_items.count()
+        from apps.cart import get_cart_summary
+        return get_cart_summary(self.pk)['lines']
 
 
 class CreditCard(CreatedBaseModel):
@@ -0,0 +1,91 @@
+import base64
+import json
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def _cursor_value(obj, field):
+    value = getattr(obj, field)
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def encode_cursor(obj, direction, fields=('created_at', 'pk')) -> str:
+    payload = json.dumps([*(_cursor_value(obj, field) for field in fields), direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, fields=('created_at', 'pk')):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(payload, list) or len(payload) != len(fields) + 1 or payload[-1] not in (NEXT, PREVIOUS):
+        return None
+    return payload[:-1], payload[-1]
+
+
+def _seek(fields, values, lookup):
+    q = Q()
+    for i, field in enumerate(fields):
+        q |= Q(**dict(zip(fields[:i], values[:i])), **{f'{field}__{lookup}': values[i]})
+    return q
+
+
+class CursorPage:
+    def __init__(self, object_list, has_next, has_previous, fields):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.fields = fields
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return encode_cursor(self.object_list[-1], NEXT, self.fields)
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return encode_cursor(self.object_list[0], PREVIOUS, self.fields)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginate_by_cursor(qs, token, per_page, fields=('created_at', 'pk')) -> CursorPage:
+    cursor = decode_cursor(token, fields) if token else None
+    descending = [f'-{field}' for field in fields]
+
+    if cursor is None:
+        rows = list(qs.order_by(*descending)[:per_page + 1])
+        return CursorPage(rows[:per_page], len(rows) > per_page, False, fields)
+
+    values, direction = cursor
+    try:
+        if direction == PREVIOUS:
+            rows = list(qs.filter(_seek(fields, values, 'gt')).order_by(*fields)[:per_page + 1])
+            return CursorPage(rows[:per_page][::-1], True, len(rows) > per_page, fields)
+
+        rows = list(qs.filter(_seek(fields, values, 'lt')).order_by(*descending)[:per_page + 1])
+    except (ValueError, TypeError, ValidationError):
+        return paginate_by_cursor(qs, None, per_page, fields)
+    return CursorPage(rows[:per_page], len(rows) > per_page, True, fields)
+
+
+class KeysetPaginationMixin:
+    cursor_param = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.cursor_param not in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+
+        page = paginate_by_cursor(queryset, self.request.GET.get(self.cursor_param), page_size)
+        return None, page, page.object_list, True
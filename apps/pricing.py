@@ -0,0 +1,36 @@
+LINE_FIELDS = ('quantity', 'price', 'discount_percent', 'shipping_cost')
+CART_LINE_FIELDS = ('quantity', 'product__price', 'product__discount_percent', 'product__shipping_cost')
+
+
+def unit_price(price, discount_percent) -> int:
+    return price * (100 - discount_percent) // 100
+
+
+def line_amount(quantity, price, discount_percent) -> int:
+    return quantity * unit_price(price, discount_percent)
+
+
+def tax_amount(amount, tax_percent) -> int:
+    return int(amount * tax_percent // 100)
+
+
+def apply_tax(totals, tax_percent):
+    taxable = totals['subtotal'] - totals.get('discount', 0) + totals['shipping_cost']
+    taxed = dict(totals, tax_percent=tax_percent, tax=tax_amount(taxable, tax_percent))
+    taxed['total'] = taxable + taxed['tax']
+    return taxed
+
+
+def apply_discount(totals, amount):
+    return apply_tax(dict(totals, discount=min(int(amount), totals['subtotal'])), totals.get('tax_percent', 0))
+
+
+def calculate(lines, tax_percent=0, discount=0):
+    totals = {'lines': 0, 'count': 0, 'subtotal': 0, 'shipping_cost': 0}
+    for quantity, price, discount_percent, shipping_cost in lines:
+        totals['lines'] += 1
+        totals['count'] += quantity
+        totals['subtotal'] += line_amount(quantity, price, discount_percent)
+        totals['shipping_cost'] += shipping_cost
+    totals['discount'] = min(int(discount), totals['subtotal'])
+    return apply_tax(totals, tax_percent)
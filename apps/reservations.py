@@ -0,0 +1,75 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+
+HOLDS = 'stock_holds'
+
+
+def _bucket(now=None):
+    return int((now or time.time()) // settings.STOCK_HOLD_BUCKET)
+
+
+def _counter_key(product_id, bucket):
+    return f'{HOLDS}:{product_id}:{bucket}'
+
+
+def _user_key(user_id):
+    return f'{HOLDS}:user:{user_id}'
+
+
+def _timeout():
+    return settings.STOCK_HOLD_TIMEOUT + settings.STOCK_HOLD_BUCKET
+
+
+def held_quantity(product_id) -> int:
+    current = _bucket()
+    window = range(current - settings.STOCK_HOLD_TIMEOUT // settings.STOCK_HOLD_BUCKET, current + 1)
+    return sum(cache.get_many([_counter_key(product_id, bucket) for bucket in window]).values())
+
+
+def _incr(key, delta):
+    cache.add(key, 0, _timeout())
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, _timeout())
+        return cache.incr(key, delta)
+
+
+def _decr(key, delta):
+    try:
+        cache.decr(key, delta)
+    except ValueError:
+        pass
+
+
+def _release(holds):
+    for product_id, (quantity, bucket) in holds.items():
+        _decr(_counter_key(product_id, bucket), quantity)
+
+
+def release_hold(user_id):
+    holds = cache.get(_user_key(user_id))
+    if holds:
+        cache.delete(_user_key(user_id))
+        _release(holds)
+
+
+def hold_stock(user_id, cart_items):
+    release_hold(user_id)
+    bucket = _bucket()
+    holds = {}
+    for cart_item in cart_items:
+        product = cart_item.product
+        if cart_item.quantity > product.stock:
+            _release(holds)
+            raise ValidationError(f'Not enough "{product.title}" in stock.')
+        _incr(_counter_key(product.pk, bucket), cart_item.quantity)
+        holds[product.pk] = cart_item.quantity, bucket
+        if held_quantity(product.pk) > product.stock:
+            _release(holds)
+            raise ValidationError(f'"{product.title}" is reserved by other customers right now, please try again later.')
+    cache.set(_user_key(user_id), holds, _timeout())
+    return holds
@@ -0,0 +1,128 @@
+import re
+from html import unescape
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, router
+from django.db.models import F, Q, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+from apps.models import Product
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = f'{Product._meta.db_table}_fts'
+FTS_WEIGHTS = 10.0, 4.0, 1.0
+
+
+def strip_html(value) -> str:
+    return re.sub(r'\s+', ' ', unescape(strip_tags(value or ''))).strip()
+
+
+def product_document(product: Product):
+    return product.title, product.short_description, strip_html(product.long_description)
+
+
+def _vendor(using=None):
+    return connections[using or router.db_for_write(Product)].vendor
+
+
+def ensure_search_index(using='default'):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5(title, short_description, long_description, tokenize='porter unicode61')"
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {Product._meta.db_table}_search_vector_gin "
+                f"ON {Product._meta.db_table} USING gin (search_vector)"
+            )
+
+
+def index_product(product: Product, using=None):
+    using = using or router.db_for_write(Product)
+    title, short_description, long_description = product_document(product)
+    vendor = _vendor(using)
+
+    if vendor == 'postgresql':
+        vector = (
+                SearchVector(Value(title, output_field=TextField()), weight='A', config=SEARCH_CONFIG) +
+                SearchVector(Value(short_description, output_field=TextField()), weight='B', config=SEARCH_CONFIG) +
+                SearchVector(Value(long_description, output_field=TextField()), weight='C', config=SEARCH_CONFIG)
+        )
+        Product.objects.using(using).filter(pk=product.pk).update(search_vector=vector)
+    elif vendor == 'sqlite':
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, short_description, long_description) VALUES (%s, %s, %s, %s)",
+                [product.pk, title, short_description, long_description]
+            )
+
+
+def index_products(products, using=None):
+    using = using or router.db_for_write(Product)
+    documents = [(product.pk, *product_document(product)) for product in products]
+    vendor = _vendor(using)
+
+    with connections[using].cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.executemany(
+                f"UPDATE {Product._meta.db_table} SET search_vector = "
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', %s), 'A') || "
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', %s), 'B') || "
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', %s), 'C') WHERE id = %s",
+                [(title, short_description, long_description, pk)
+                 for pk, title, short_description, long_description in documents]
+            )
+        elif vendor == 'sqlite':
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk, *_ in documents])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, short_description, long_description) VALUES (%s, %s, %s, %s)",
+                documents
+            )
+
+
+def unindex_product(pk, using=None):
+    using = using or router.db_for_write(Product)
+    if _vendor(using) == 'sqlite':
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+
+def _fts5_query(query):
+    tokens = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_products(qs, query):
+    vendor = _vendor(qs.db)
+
+    if vendor == 'postgresql':
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        return qs.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-created_at')
+
+    if vendor == 'sqlite':
+        match = _fts5_query(query)
+        if not match:
+            return qs.none()
+        weights = ', '.join(map(str, FTS_WEIGHTS))
+        return qs.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {Product._meta.db_table}.id",
+                [match]
+            )
+        ).order_by('-search_rank', '-created_at')
+
+    return qs.filter(
+        Q(title__icontains=query) |
+        Q(short_description__icontains=query) |
+        Q(long_description__icontains=query)
+    )
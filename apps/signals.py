@@ -3,10 +3,20 @@ import os
 from allauth.socialaccount.models import SocialAccount
 from django.core.files import File
 from django.core.files.temp import NamedTemporaryFile
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, post_migrate, pre_save
 from django.dispatch import receiver
+from mptt.signals import node_moved
 
-from apps.models import User
+from apps.cache import invalidate_category_tree, invalidate_catalog, invalidate_site_settings
+from apps.cart import invalidate_cart_summaries
+from apps.coupons import invalidate_coupons
+from apps.models import User, Product, Category, ProductImage, SiteSettings
+from apps.models.products import Review, Coupon, Tag
+from apps.search import ensure_search_index, index_product, unindex_product
+from apps.specifications import sync_specification
+from apps.tasks import generate_image_derivatives
 
 
 @receiver(post_save, sender=SocialAccount)
@@ -26,3 +36,99 @@ def post_save_socialaccount(sender, instance: SocialAccount, **kwargs):
                 user.image.save(os.path.basename(photo_url), File(img_temp), save=True)
             except:
                 pass
+
+
+@receiver(post_migrate)
+def post_migrate_search_index(sender, using, **kwargs):
+    if sender.name == 'apps':
+        ensure_search_index(using)
+
+
+@receiver(post_save, sender=Product)
+def post_save_product_search(sender, instance: Product, using, raw=False, **kwargs):
+    if not raw:
+        index_product(instance, using)
+        sync_specification(instance, using)
+
+
+@receiver(post_delete, sender=Product)
+def post_delete_product_search(sender, instance: Product, using, **kwargs):
+    unindex_product(instance.pk, using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+def category_tree_changed(sender, **kwargs):
+    invalidate_category_tree()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def catalog_changed(sender, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def site_settings_changed(sender, **kwargs):
+    invalidate_site_settings()
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def coupon_changed(sender, **kwargs):
+    invalidate_coupons()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_prices_changed(sender, **kwargs):
+    invalidate_cart_summaries()
+
+
+def update_review_stats(product_id, rating, sign):
+    star = min(max(int(rating), 1), 5)
+    Product.objects.filter(pk=product_id).update(
+        review_count=F('review_count') + sign,
+        rating_sum=F('rating_sum') + sign * int(rating),
+        **{f'rating_{star}': F(f'rating_{star}') + sign}
+    )
+    invalidate_catalog()
+
+
+@receiver(pre_save, sender=Review)
+def pre_save_review(sender, instance: Review, raw=False, **kwargs):
+    instance._previous_review = None
+    if instance.pk and not raw:
+        instance._previous_review = Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def post_save_review(sender, instance: Review, created, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_review', None)
+    if raw or (not created and previous == (instance.product_id, instance.rating)):
+        return
+    if previous:
+        update_review_stats(*previous, -1)
+    if created or previous:
+        update_review_stats(instance.product_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def post_delete_review(sender, instance: Review, **kwargs):
+    update_review_stats(instance.product_id, instance.rating, -1)
+
+
+@receiver(post_save, sender=ProductImage)
+def post_save_product_image(sender, instance: ProductImage, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and 'image' not in update_fields):
+        return
+    transaction.on_commit(lambda: generate_image_derivatives.delay(instance.pk))
@@ -0,0 +1,41 @@
+from apps.models import Product, ProductSpecification
+
+PARAM_PREFIX = 'spec.'
+
+
+def normalize(value) -> str:
+    return str(value).strip().lower()[:255]
+
+
+def specification_rows(product: Product):
+    if not isinstance(product.specification, dict):
+        return []
+    return [
+        ProductSpecification(product_id=product.pk, key=normalize(key)[:100], value=normalize(value))
+        for key, value in product.specification.items()
+        if value not in (None, '')
+    ]
+
+
+def sync_specification(product: Product, using=None):
+    ProductSpecification.objects.using(using).filter(product_id=product.pk).delete()
+    ProductSpecification.objects.using(using).bulk_create(specification_rows(product), ignore_conflicts=True)
+
+
+def sync_specifications(products, using=None):
+    ProductSpecification.objects.using(using).filter(product_id__in=[product.pk for product in products]).delete()
+    ProductSpecification.objects.using(using).bulk_create(
+        [row for product in products for row in specification_rows(product)], batch_size=1000, ignore_conflicts=True
+    )
+
+
+def filter_by_specification(qs, params):
+    for param in params:
+        if not param.startswith(PARAM_PREFIX):
+            continue
+        values = [normalize(value) for value in params.getlist(param) if value]
+        if values:
+            qs = qs.filter(pk__in=ProductSpecification.objects.filter(
+                key=normalize(param.removeprefix(PARAM_PREFIX)), value__in=values
+            ).values('product_id'))
+    return qs
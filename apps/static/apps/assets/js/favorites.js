@@ -0,0 +1,30 @@
+document.addEventListener('click', function (event) {
+    const button = event.target.closest('.favorite-toggle');
+    if (!button) {
+        return;
+    }
+    event.preventDefault();
+
+    const csrfToken = document.cookie.split('; ').find(row => row.startsWith('csrftoken='));
+    const liked = button.dataset.liked !== '1';
+    fetch(button.dataset.url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'X-CSRFToken': csrfToken ? csrfToken.split('=')[1] : ''
+        },
+        body: `liked=${liked ? 1 : 0}`
+    })
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                console.error(data.error);
+                return;
+            }
+            button.dataset.liked = data.liked ? '1' : '0';
+            button.classList.toggle('btn-danger', data.liked);
+            button.classList.toggle('btn-outline-danger', !data.liked);
+            button.querySelector('.favorite-count').innerText = data.favorite_count;
+        })
+        .catch(error => console.error('Error:', error));
+});
@@ -1,7 +1,20 @@
+import os
+from urllib.parse import urlparse
+
+import requests
 from celery import shared_task
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.mail import send_mail
+from django.utils.dateparse import parse_date
 
-from apps.models import User
+from apps.analytics import refresh_daily_sales
+from apps.cache import invalidate_catalog
+from apps.exports import write_xlsx
+from apps.importer import import_products, read_feed
+from apps.images import render_derivatives
+from apps.models import User, ProductImage, Order
+from apps.utils import render_invoice
 from core import settings
 
 
@@ -20,5 +33,53 @@ def send_to_email(subject, email):
         )
 
 
+@shared_task
+def generate_image_derivatives(image_id):
+    product_image = ProductImage.objects.filter(pk=image_id).first()
+    if product_image is None or not product_image.image:
+        return
+    derivatives = render_derivatives(product_image.image.name)
+    ProductImage.objects.filter(pk=image_id, image=product_image.image.name).update(derivatives=derivatives)
+    invalidate_catalog()
+
+
+@shared_task
+def generate_invoice(order_id, force=False):
+    order = Order.objects.filter(pk=order_id).first()
+    if order is not None:
+        render_invoice(order, force)
+
+
+@shared_task
+def refresh_sales_rollups(full=False):
+    return refresh_daily_sales(full)
 
-                
\ No newline at end of file
+
+@shared_task
+def export_xlsx(name, email, base_url, date_from=None, date_to=None):
+    path = write_xlsx(name, parse_date(date_from or ''), parse_date(date_to or ''))
+    send_mail(
+        f'Export "{name}" is ready',
+        f'Your export is ready: {base_url}{default_storage.url(path)}',
+        settings.EMAIL_HOST_USER,
+        [email],
+        fail_silently=False,
+    )
+    return path
+
+
+@shared_task(autoretry_for=(requests.RequestException,), retry_backoff=True, max_retries=3)
+def download_product_image(product_id, url):
+    if ProductImage.objects.filter(product_id=product_id, source_url=url).exists():
+        return
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    image = ProductImage(product_id=product_id, source_url=url)
+    image.image.save(os.path.basename(urlparse(url).path) or 'image.jpg', ContentFile(response.content), save=True)
+
+
+@shared_task
+def import_product_feed(path, batch_size=1000):
+    with default_storage.open(path, 'r') as f:
+        stats, errors = import_products(read_feed(f), batch_size)
+    return {**stats, 'errors': errors[:100]}
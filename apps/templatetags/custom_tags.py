@@ -5,6 +5,8 @@ from decimal import Decimal
 from django.template import Library
 from django.utils.formats import number_format
 
+from apps.pricing import tax_amount
+
 register = Library()
 
 
@@ -16,10 +18,8 @@ def editor_phone_number(value, arg=None) -> str:
 
 
 @register.filter()
-def is_liked(user, product) -> bool:
-    if user.is_anonymous:
-        return False
-    return user.favorite_set.filter(product=product).exists()
+def is_liked(product, liked_ids) -> bool:
+    return product.pk in liked_ids
 
 
 @register.filter(is_safe=True)
@@ -77,7 +77,7 @@ def multiplication(a, b):
 
 @register.filter()
 def tax_sum(a, b):
-    return a * b // 100
+    return tax_amount(a, b)
 
 
 @register.filter()
@@ -1,3 +1,519 @@
-from django.test import TestCase
+import time
+from threading import Barrier, Thread
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.analytics import refresh_daily_sales
+from apps.benchmarks import benchmark_category_filter, benchmark_category_loads, benchmark_checkout, \
+    benchmark_facets, benchmark_specification_filters
+from apps.cache import CATALOG, CATEGORY_TREE, get_tax_percent, get_version
+from apps.cart import add_to_cart, get_cart_summary, set_cart_quantity
+from apps.categories import bulk_category_updates, filter_by_category, find_tree_errors
+from apps.coupons import COUPONS, redeem_coupon, reserve_coupon
+from apps.favorites import get_favorite_ids, set_favorite
+from apps.forms import OrderCreateModelForm
+from apps.importer import import_products
+from apps.models import Address, DailySales, DailySalesTotal, Order, OrderItem, Product, Category, ProductImage, \
+    ProductSpecification, SiteSettings, User
+from apps.models.products import CartItem, Coupon, Favorite, Review, Tag
+from apps.reservations import held_quantity, hold_stock
+from apps.search import ensure_search_index, search_products, strip_html
+from apps.views import catalog_queryset
+
+
+def create_product(category, title='Phone', stock=5):
+    return Product.objects.create(title=title, short_description='short', long_description='long', price=100,
+                                  stock=stock, category=category)
+
+
+def create_customer(username='customer', cart_product=None, quantity=1):
+    user = User.objects.create_user(username, password='password')
+    address = Address.objects.create(user=user, full_name='Customer', street='Main', zip_code=1, city='City',
+                                     phone='123')
+    if cart_product:
+        CartItem.objects.create(user=user, product=cart_product, quantity=quantity)
+    return user, address
+
+
+def order_data(user, address, **extra):
+    return {'payment_method': 'paypal', 'address': address.pk, 'owner': user.pk, **extra}
+
+
+class CatalogTestMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Electronics')
+        cls.products = [create_product(cls.category, f'Phone {i}') for i in range(12)]
+        for product in cls.products:
+            ProductImage.objects.create(product=product, image='products/a.jpg')
+            ProductImage.objects.create(product=product, image='products/b.jpg')
+        cls.user = User.objects.create_user('customer', password='password')
+        Favorite.objects.create(user=cls.user, product=cls.products[-1])
+        Review.objects.create(product=cls.products[0], rating=4, name='Customer', email='customer@example.com',
+                              review_text='Good')
+
+    def setUp(self):
+        cache.clear()
+
+
+class CatalogQueryCountTest(CatalogTestMixin, TestCase):
+    def test_anonymous_list(self):
+        with self.assertNumQueries(6):
+            self.assertEqual(self.client.get(reverse('product_list_page')).status_code, 200)
+
+    def test_authenticated_list(self):
+        self.client.force_login(self.user)
+        with self.assertNumQueries(10):
+            self.assertEqual(self.client.get(reverse('product_list_page')).status_code, 200)
+
+    def test_cached_anonymous_list(self):
+        self.client.get(reverse('product_list_page'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('product_list_page')).status_code, 200)
+
+    def test_grid(self):
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.get(reverse('product_grid')).status_code, 200)
+
+    def test_detail(self):
+        with self.assertNumQueries(5):
+            self.assertEqual(self.client.get(reverse('product_detail', args=[self.products[0].pk])).status_code, 200)
+
+
+class CatalogConditionalGetTest(CatalogTestMixin, TestCase):
+    def test_review_changes_etag(self):
+        url = reverse('product_detail', args=[self.products[0].pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.products[0], rating=2, name='Other', email='other@example.com',
+                                  review_text='Bad')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_category_rename_changes_etag(self):
+        url = reverse('product_grid')
+        etag = self.client.get(url)['ETag']
+        self.category.name = 'Gadgets'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_versions_are_bumped_after_commit(self):
+        versions = get_version(CATEGORY_TREE), get_version(CATALOG), get_version(COUPONS)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.category.name = 'Gadgets'
+            self.category.save()
+            Coupon.objects.create(code='SAVE10', discount_amount=10)
+            self.assertEqual((get_version(CATEGORY_TREE), get_version(CATALOG), get_version(COUPONS)), versions)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_version(CATEGORY_TREE), versions[0])
+        self.assertNotEqual(get_version(CATALOG), versions[1])
+        self.assertNotEqual(get_version(COUPONS), versions[2])
+
+
+class ProductRatingCountersTest(CatalogTestMixin, TestCase):
+    def test_stale_save_keeps_review_counters(self):
+        product = Product.objects.get(pk=self.products[1].pk)
+        Review.objects.create(product=product, rating=5, name='Other', email='other@example.com', review_text='Great')
+
+        product.title = 'Renamed'
+        product.save()
+
+        product.refresh_from_db()
+        self.assertEqual((product.title, product.review_count, product.rating_sum, product.rating_5),
+                         ('Renamed', 1, 5, 1))
+
+
+class CatalogPaginationTest(CatalogTestMixin, TestCase):
+    def test_page_links_keep_filters(self):
+        tag = Tag.objects.create(name='Phones')
+        tag.product_set.set(self.products)
+        response = self.client.get(reverse('product_grid'), {'tag': 'phones', 'in_stock': '1', 'search': 'phone'})
+        self.assertContains(response, 'href="?tag=phones&amp;in_stock=1&amp;search=phone&amp;page=2"')
+
+    def test_page_links_keep_specification_filters(self):
+        ProductSpecification.objects.bulk_create(
+            ProductSpecification(product=product, key=key, value=value)
+            for product in self.products for key, value in (('color', 'black'), ('memory', '128gb'))
+        )
+        response = self.client.get(reverse('product_grid'), {'spec.color': ['black', 'white'], 'spec.memory': '128gb'})
+        self.assertContains(response, 'href="?spec.color=black&amp;spec.color=white&amp;spec.memory=128gb&amp;page=2"')
+
+
+class CartSummaryTest(CatalogTestMixin, TestCase):
+    def test_mutations_invalidate_summary(self):
+        self.assertEqual(get_cart_summary(self.user.pk)['count'], 0)
+        add_to_cart(self.user.pk, self.products[0], 2)
+        add_to_cart(self.user.pk, self.products[0])
+        self.assertEqual(get_cart_summary(self.user.pk)['count'], 3)
+
+        item = CartItem.objects.get(user=self.user)
+        set_cart_quantity(self.user.pk, item.pk, 1)
+        self.assertEqual((get_cart_summary(self.user.pk)['count'], get_cart_summary(self.user.pk)['subtotal']), (1, 100))
+
+        self.client.force_login(self.user)
+        self.client.get(reverse('delete_cart_item', args=[item.pk]))
+        self.assertEqual(get_cart_summary(self.user.pk)['lines'], 0)
+
+
+def is_table_lock(error):
+    # sqlite's shared in-memory test database reports lock contention instead of waiting for the lock
+    return isinstance(error, OperationalError) and 'database table is locked' in str(error)
+
+
+def run_concurrently(target, args_list):
+    barrier = Barrier(len(args_list))
+
+    def run(*args):
+        barrier.wait()
+        try:
+            target(*args)
+        finally:
+            connection.close()
+
+    threads = [Thread(target=run, args=args) for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class ConcurrentOrderTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = create_product(Category.objects.create(name='Electronics'), 'Last phone', stock=1)
+        self.orders = [order_data(*create_customer(f'customer{i}', self.product)) for i in range(2)]
+
+    @patch('apps.forms.generate_invoice')
+    def test_single_unit_is_sold_once(self, generate_invoice):
+        results = []
+
+        def place(index, data):
+            for attempt in range(20):
+                try:
+                    form = OrderCreateModelForm(data)
+                    form.is_valid()
+                    form.save()
+                except ValidationError as e:
+                    # colliding stock holds ask the customer to try again; anything else is the final answer
+                    if 'reserved by other customers' not in str(e):
+                        results.append(False)
+                        return
+                except OperationalError as e:
+                    if not is_table_lock(e):
+                        raise
+                else:
+                    results.append(True)
+                    return
+                # back off by a different amount per customer so retries stop colliding
+                time.sleep(0.01 * (index + 1))
+
+        run_concurrently(place, list(enumerate(self.orders)))
+
+        self.assertEqual(sorted(results), [False, True])
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+
+class CheckoutStockTest(CatalogTestMixin, TestCase):
+    @patch('apps.forms.hold_stock')
+    def test_short_line_rolls_back_the_whole_cart(self, hold_stock):
+        user, address = create_customer('buyer', self.products[0], quantity=2)
+        CartItem.objects.create(user=user, product=self.products[1], quantity=6)
+        form = OrderCreateModelForm(order_data(user, address))
+        self.assertTrue(form.is_valid(), form.errors)
+
+        with self.assertRaisesMessage(ValidationError, 'Not enough "Phone 1" in stock.'):
+            form.save()
+        self.assertEqual(list(Product.objects.filter(pk__in=[self.products[0].pk, self.products[1].pk]).values_list(
+            'stock', flat=True)), [5, 5])
+
+    @patch('apps.forms.generate_invoice')
+    def test_query_count_does_not_grow_with_cart_lines(self, generate_invoice):
+        counts = []
+        for lines in (1, 10):
+            user, address = create_customer(f'buyer{lines}')
+            CartItem.objects.bulk_create([CartItem(user=user, product=product, quantity=1)
+                                          for product in self.products[:lines]])
+            form = OrderCreateModelForm(order_data(user, address))
+            self.assertTrue(form.is_valid(), form.errors)
+            with CaptureQueriesContext(connection) as queries:
+                form.save()
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class OrderTaxTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch('apps.forms.generate_invoice')
+    def test_order_uses_current_tax(self, generate_invoice):
+        SiteSettings.objects.create(tax=10)
+        self.assertEqual(get_tax_percent(), 10)
+        SiteSettings.objects.update(tax=20)
+
+        product = create_product(Category.objects.create(name='Electronics'))
+        form = OrderCreateModelForm(order_data(*create_customer(cart_product=product)))
+        self.assertTrue(form.is_valid(), form.errors)
+
+        self.assertEqual(form.save().tax_percent, 20)
+
+
+class CouponLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.coupon = Coupon.objects.create(code='SAVE10', discount_amount=10, usage_limit=500)
+
+    def test_concurrent_reservations_respect_limit(self):
+        results = []
+
+        def reserve(first_user_id):
+            for user_id in range(first_user_id, first_user_id + 40):
+                try:
+                    results.append(reserve_coupon(self.coupon, user_id)[1])
+                except ValidationError:
+                    results.append(None)
+
+        run_concurrently(reserve, [(i * 40,) for i in range(50)])
+
+        slots = [slot for slot in results if slot is not None]
+        self.assertEqual(len(results), 2000)
+        self.assertEqual(sorted(slots), list(range(500)))
+
+    def test_seeded_counter_is_not_recounted(self):
+        reserve_coupon(self.coupon, 1)
+        with self.assertNumQueries(0):
+            reserve_coupon(self.coupon, 2)
+
+    @patch('apps.forms.generate_invoice')
+    def test_database_enforces_limit_without_cache(self, generate_invoice):
+        Coupon.objects.filter(pk=self.coupon.pk).update(usage_limit=1)
+        product = create_product(Category.objects.create(name='Electronics'))
+        forms = [
+            OrderCreateModelForm(order_data(*create_customer(f'customer{i}', product), coupon='save10'))
+            for i in range(2)
+        ]
+
+        self.assertTrue(forms[0].is_valid(), forms[0].errors)
+        forms[0].save()
+        # a counter lost while the first order was in flight reads as unused
+        cache.set(f'coupons:used:{self.coupon.pk}', 0, None)
+        self.assertTrue(forms[1].is_valid(), forms[1].errors)
+        with self.assertRaisesMessage(ValidationError, 'fully redeemed'):
+            forms[1].save()
+
+        self.assertEqual(list(self.coupon.redemptions.values_list('slot', flat=True)), [0])
+
+
+class ConcurrentCouponRedemptionTest(TransactionTestCase):
+    def test_colliding_slots_never_exceed_limit(self):
+        coupon = Coupon.objects.create(code='FLASH', discount_amount=10, usage_limit=5, per_user_limit=1)
+        orders = []
+        for i in range(20):
+            user, address = create_customer(f'customer{i}')
+            orders.append(Order.objects.create(owner=user, address=address, payment_method='paypal'))
+        # the same user checking out twice at once
+        orders.append(Order.objects.create(owner=orders[0].owner, address=orders[0].address, payment_method='paypal'))
+        results = []
+
+        def redeem(order):
+            for attempt in range(50):
+                try:
+                    with transaction.atomic():
+                        # every checkout starts from the same slot, the worst case for a lost cache counter
+                        redeem_coupon(coupon, order, slot=0)
+                except ValidationError:
+                    results.append(False)
+                    return
+                except OperationalError as e:
+                    if not is_table_lock(e):
+                        raise
+                    time.sleep(0.01)
+                else:
+                    results.append(True)
+                    return
+
+        run_concurrently(redeem, [(order,) for order in orders])
+
+        self.assertEqual(len(results), len(orders))
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(sorted(coupon.redemptions.values_list('slot', flat=True)), [0, 1, 2, 3, 4])
+        self.assertLessEqual(coupon.redemptions.filter(user=orders[0].owner).count(), 1)
+
+
+class StockHoldTest(CatalogTestMixin, TestCase):
+    def test_own_quantity_over_stock_is_a_stock_error(self):
+        CartItem.objects.create(user=self.user, product=self.products[0], quantity=6)
+        cart_items = CartItem.objects.filter(user=self.user).select_related('product')
+        with self.assertRaisesMessage(ValidationError, 'Not enough "Phone 0" in stock.'):
+            hold_stock(self.user.pk, cart_items)
+        self.assertEqual(held_quantity(self.products[0].pk), 0)
+
+
+class DailySalesTest(CatalogTestMixin, TestCase):
+    def test_totals_include_coupon_discount(self):
+        user, address = create_customer('buyer')
+        order = Order(owner=user, address=address, payment_method='paypal')
+        items = [OrderItem(order=order, product=self.products[0], quantity=3)]
+        items[0].snapshot_product(self.products[0])
+        order.calculate_totals(items, 0, discount=50)
+        order.save()
+        OrderItem.objects.bulk_create(items)
+
+        refresh_daily_sales(full=True)
+
+        total = DailySalesTotal.objects.get()
+        self.assertEqual((total.units, total.revenue, total.orders), (3, 250, 1))
+        self.assertEqual(DailySales.objects.get().revenue, 300)
+
+
+class ProductImportTest(TestCase):
+    def test_invalid_rows_are_reported_not_fatal(self):
+        rows = [
+            {'sku': 'A-1', 'title': 'Phone', 'price': '100', 'category': 'Electronics'},
+            {'sku': 'A-2', 'title': 'Phone', 'price': '100', 'discount_percent': '150', 'category': 'Electronics'},
+            {'sku': 'A-3', 'title': 'x' * 300, 'price': '100', 'category': 'Electronics'},
+            {'sku': 'A' * 65, 'title': 'Phone', 'price': '100', 'category': 'Electronics'},
+        ]
+        stats, errors = import_products(rows)
+
+        self.assertEqual((stats['created'], stats['failed']), (1, 3))
+        self.assertEqual([line for line, _ in errors], [2, 3, 4])
+        self.assertIn('discount_percent', errors[0][1])
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ['A-1'])
+
+
+class BulkCategoryUpdatesTest(TestCase):
+    def test_versions_are_bumped_once_after_commit(self):
+        versions = get_version(CATEGORY_TREE), get_version(CATALOG)
+        with self.captureOnCommitCallbacks() as callbacks:
+            with bulk_category_updates():
+                root = Category.objects.create(name='Electronics')
+                for i in range(3):
+                    Category.objects.create(name=f'Phones {i}', parent=root)
+            self.assertEqual((get_version(CATEGORY_TREE), get_version(CATALOG)), versions)
+
+        self.assertEqual(len(callbacks), 2)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual((get_version(CATEGORY_TREE), get_version(CATALOG)), versions)
+        self.assertEqual(find_tree_errors(), [])
+
+
+class CategoryFilterTest(CatalogTestMixin, TestCase):
+    def test_parent_category_lists_descendants(self):
+        phones = Category.objects.create(name='Phones', parent=self.category)
+        Product.objects.filter(pk=self.products[0].pk).update(category=phones)
+
+        self.assertEqual(filter_by_category(Product.objects.all(), self.category.slug).count(), 12)
+        self.assertEqual(list(filter_by_category(Product.objects.all(), phones.slug)), [self.products[0]])
+        self.assertFalse(filter_by_category(Product.objects.all(), 'missing').exists())
+
+
+class BenchmarkTest(TestCase):
+    def test_category_filter_benchmark(self):
+        rows = benchmark_category_filter(size=50, products=200, fanout=3, repeat=1)
+        self.assertEqual([row['descendants'] for row in rows][0], 49)
+        self.assertEqual(rows[0]['products'], 200)
+        self.assertFalse(Product.objects.exists())
+
+    def test_facets_benchmark(self):
+        rows = benchmark_facets(products=300, categories=30, tags=5, repeat=1)
+        self.assertEqual(rows[0]['products'], 300)
+        self.assertFalse(Tag.objects.exists())
+
+    def test_specification_filters_benchmark(self):
+        rows = benchmark_specification_filters(sizes=(100, 300), matches=10, repeat=1)
+        self.assertEqual([row['matches'] for row in rows if row['filter'] == 'spec.color=red'], [10, 10])
+        self.assertFalse(ProductSpecification.objects.exists())
+
+    def test_checkout_benchmark(self):
+        rows = benchmark_checkout(orders=3, lines=(1, 5))
+        self.assertLess(rows[1]['bulk_queries'], rows[1]['per_row_queries'])
+        self.assertFalse(Order.objects.exists())
+
+    def test_category_loads_benchmark(self):
+        rows = benchmark_category_loads(sizes=(40,), fanout=3)
+        self.assertEqual(rows[0]['errors'], 0)
+        self.assertFalse(Category.objects.exists())
+
+
+class CartInvalidationTest(TransactionTestCase):
+    def test_add_to_cart_invalidates_after_commit(self):
+        user, address = create_customer()
+        product = create_product(Category.objects.create(name='Electronics'))
+        in_transaction = []
+        with patch('apps.cart.cart_changed', side_effect=lambda user_id: in_transaction.append(
+                connection.in_atomic_block)):
+            add_to_cart(user.pk, product)
+            add_to_cart(user.pk, product)
+        self.assertEqual(in_transaction, [False, False])
+        self.assertEqual(get_cart_summary(user.pk)['count'], 2)
+
+
+class FavoriteToggleTest(CatalogTestMixin, TestCase):
+    def test_toggle_writes_through_a_stale_cache(self):
+        liked, other = self.products[-1], self.products[0]
+        cache.set(f'favorites:{self.user.pk}', {other.pk}, None)
+
+        self.assertEqual(set_favorite(self.user.pk, liked.pk, False), set())
+        self.assertFalse(Favorite.objects.filter(user=self.user, product=liked).exists())
+
+        self.assertEqual(set_favorite(self.user.pk, other.pk, True), {other.pk})
+        self.assertTrue(Favorite.objects.filter(user=self.user, product=other).exists())
+        self.assertEqual(get_favorite_ids(self.user.pk), {other.pk})
+
+
+class ProductSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ensure_search_index()
+        category = Category.objects.create(name='Electronics')
+        cls.described = Product.objects.create(
+            title='Tripod', short_description='short', price=100, category=category,
+            long_description='<p class="lens">Fits any <b>camera</b>&nbsp;body</p>'
+        )
+        cls.titled = create_product(category, 'Camera')
+
+    def search(self, query):
+        return list(search_products(Product.objects.all(), query))
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(self.search('camera'), [self.titled, self.described])
+
+    def test_markup_is_not_indexed(self):
+        self.assertEqual(strip_html(self.described.long_description), 'Fits any camera body')
+        self.assertEqual(self.search('lens'), [])
+        self.assertEqual(self.search('body'), [self.described])
+
+    def test_save_reindexes(self):
+        self.titled.title = 'Webcam'
+        self.titled.save()
+        self.assertEqual(self.search('webcam'), [self.titled])
+        self.assertEqual(self.search('camera'), [self.described])
+
+    def test_catalog_defers_search_vector(self):
+        with CaptureQueriesContext(connection) as loaded:
+            Product.objects.get(pk=self.titled.pk).save()
+        product = catalog_queryset().get(pk=self.titled.pk)
+        self.assertIn('search_vector', product.get_deferred_fields())
+        # saving the deferred instance neither reloads the vector nor writes it back
+        with CaptureQueriesContext(connection) as deferred:
+            product.save()
+        self.assertEqual(len(deferred), len(loaded) - 1)
+        self.assertFalse([query for query in deferred if query['sql'].startswith('UPDATE "apps_product"')
+                          and 'search_vector' in query['sql']])
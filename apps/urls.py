@@ -4,11 +4,13 @@ from apps.views import ProductListView, ProductDetailView, CustomLoginView, Cust
     CustomSettingsView, AddToCartView, CartListView, CartItemDeleteView, FavouriteView, \
     CheckoutView, AddressUpdateView, AddressCreateView, OrderListView, OrderDeleteView, \
     OrderDetailView, CustomOrderListView, CustomerOrderCreateView, CustomOrderDetailView, ProductGridView, \
-    CustomerGetProView
+    CustomerGetProView, ProductReviewView, CartItemQuantityView, ApplyCouponView, FavouriteListView, \
+    OrderInvoiceView, OrderInvoiceExportView, SalesDashboardView, DataExportView
 
 urlpatterns = [
     path('', ProductListView.as_view(), name='product_list_page'),
     path('product-detail/<int:pk>/', ProductDetailView.as_view(), name='product_detail'),
+    path('product-detail/<int:pk>/review', ProductReviewView.as_view(), name='product_review'),
     path('product-grid', ProductGridView.as_view(), name='product_grid'),
     path('login', CustomLoginView.as_view(), name='login_page'),
     path('logout', CustomLogoutView.as_view(), name='logout_page'),
@@ -17,15 +19,22 @@ urlpatterns = [
     path('shopping-cart', CartListView.as_view(), name='shopping_cart_page'),
     path('add-to-cart/<int:pk>/', AddToCartView.as_view(), name='add_cart_page'),
     path('remove-cart/<int:pk>/', CartItemDeleteView.as_view(), name='delete_cart_item'),
+    path('cart-quantity/<int:pk>/', CartItemQuantityView.as_view(), name='update_cart_quantity'),
     path('favorite/<int:pk>', FavouriteView.as_view(), name='favorite_page'),
+    path('favorites', FavouriteListView.as_view(), name='favorite_list'),
     path('checkout', CheckoutView.as_view(), name='checkout_page'),
+    path('apply-coupon', ApplyCouponView.as_view(), name='apply_coupon'),
     path('update-address/<int:pk>', AddressUpdateView.as_view(), name='update_address'),
     path('create-address', AddressCreateView.as_view(), name='create_address'),
     path('orders', OrderListView.as_view(), name='orders_list'),
+    path('orders/invoices.zip', OrderInvoiceExportView.as_view(), name='orders_invoices_export'),
+    path('orders/sales', SalesDashboardView.as_view(), name='sales_dashboard'),
+    path('exports/<slug:name>', DataExportView.as_view(), name='data_export'),
     path('order/<int:pk>', OrderDetailView.as_view(), name='order_detail'),
     path('custom-order-create', CustomerOrderCreateView.as_view(), name='create_order'),
     path('custom-get-pro', CustomerGetProView.as_view(), name='custom_get_pro'),
     path('order/delete/<int:pk>', OrderDeleteView.as_view(), name='order_delete'),
     path('custom-order-list', CustomOrderListView.as_view(), name="custom_order_list"),
-    path('custom-order-detail/<int:pk>', CustomOrderDetailView.as_view(), name='custom_order_detail')
+    path('custom-order-detail/<int:pk>', CustomOrderDetailView.as_view(), name='custom_order_detail'),
+    path('order/<int:pk>/invoice', OrderInvoiceView.as_view(), name='order_invoice'),
 ]
@@ -1,24 +1,49 @@
-import os.path
-
+import hashlib
+import json
+import zipfile
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 
-from apps.models import SiteSettings, Order
-from core.settings import MEDIA_ROOT
+from apps.models import Order
+from apps.pricing import LINE_FIELDS, line_amount, unit_price
+
+INVOICE_FOLDER = 'order/pdf'
+INVOICE_BOTTOM_MARGIN = 60
+INVOICE_SUMMARY_HEIGHT = 160
+
+
+def invoice_lines(order: Order):
+    return list(order.orderitem_set.order_by('pk').values_list('product__title', *LINE_FIELDS))
+
+
+def invoice_hash(order: Order, lines) -> str:
+    payload = [order.pk, lines, order.subtotal, order.discount, order.shipping_cost, order.tax_percent, order.tax,
+               order.total]
+    return hashlib.sha256(json.dumps(payload, default=str).encode()).hexdigest()
+
 
+def _draw_table_header(c, x_offset, y_offset, width, line_height):
+    headers = ['ID', 'Product name', 'Quantity', 'Price', 'Amount']
+    c.setFillColor(colors.lightblue)
+    c.rect(x_offset, y_offset, width - 2 * x_offset, line_height, fill=1)
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica-Bold", 12)
+    for i, header in enumerate(headers):
+        c.drawString(x_offset + i * 95, y_offset + 5, header)
+    c.setFont("Helvetica", 12)
 
-def make_pdf(order: Order):
-    data = order.orderitem_set.values_list('product__title', 'quantity', 'product__discount_percent', 'product__price',
-                                           'product__shipping_cost')
 
-    # Create a canvas object
-    pdf_file_folder = 'order/pdf'
-    if not os.path.exists(f"{MEDIA_ROOT}/{pdf_file_folder}"):
-        os.makedirs(f"{MEDIA_ROOT}/{pdf_file_folder}")
+def make_pdf(order: Order, lines=None) -> bytes:
+    lines = invoice_lines(order) if lines is None else lines
 
-    pdf_file_name = f"{pdf_file_folder}/order_{order.pk}.pdf"
-    c = canvas.Canvas(f"{MEDIA_ROOT}/{pdf_file_name}", pagesize=letter)
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
     width, height = letter
 
     title = f"Order Detail #{order.pk}"
@@ -26,60 +51,53 @@ def make_pdf(order: Order):
     title_width = c.stringWidth(title, 'Helvetica-Bold', 18)
     c.drawString((width - title_width) / 2, height - 40, title)
 
-    c.setFont("Helvetica", 14)
     x_offset = 50
     y_offset = height - 100
     line_height = 25
 
-    headers = ['ID', 'Product name', 'Quantity', 'Price', 'Amount']
-    c.setFillColor(colors.lightblue)
-    c.rect(x_offset, y_offset, width - 2 * x_offset, line_height, fill=1)
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica-Bold", 12)
-    for i, header in enumerate(headers):
-        if i == 1:
-            c.drawString(x_offset + i * 95, y_offset + 5, header)
-        else:
-            c.drawString(x_offset + i * 95, y_offset + 5, header)
-
-    total_price = 0
-    total_shipping_cost = 0
-    c.setFont("Helvetica", 12)
+    _draw_table_header(c, x_offset, y_offset, width, line_height)
     y_offset -= line_height
 
-    for index, row in enumerate(data, 1):
-        row = list(row)
-        discount = row.pop(2)
+    for index, row in enumerate(lines, 1):
+        if y_offset < INVOICE_BOTTOM_MARGIN:
+            c.showPage()
+            y_offset = height - 60
+            _draw_table_header(c, x_offset, y_offset, width, line_height)
+            y_offset -= line_height
+
         row_color = colors.whitesmoke if index % 2 == 0 else colors.lightgrey
         c.setFillColor(row_color)
         c.rect(x_offset, y_offset, width - 2 * x_offset, line_height, fill=1)
         c.setFillColor(colors.black)
 
-        product_name, quantity, price, shipping_cost = row
-        price = price * (100 - discount) // 100
-        subtotal = quantity * price
-        total_price += subtotal
-        total_shipping_cost += shipping_cost
+        product_name, quantity, price, discount, _ = row
+        subtotal = line_amount(quantity, price, discount)
+        price = unit_price(price, discount)
 
         for i, item in enumerate([index, product_name, quantity, f"{price} $", f"{subtotal} $"]):
             c.drawString(x_offset + i * 95, y_offset + 5, str(item))
         y_offset -= line_height
 
+    if y_offset < INVOICE_BOTTOM_MARGIN + INVOICE_SUMMARY_HEIGHT:
+        c.showPage()
+        c.setFont("Helvetica", 12)
+        y_offset = height - 60
+
     y_offset -= line_height
-    text = f'Subtotal: {total_price} $'
+    text = f'Subtotal: {order.subtotal} $'
     c.drawString(x_offset, y_offset, text)
 
-    site = SiteSettings.objects.first()
-    if site:
-        total_price += total_shipping_cost
+    if order.discount:
         y_offset -= line_height
-        tax_amount = total_price * site.tax // 100
-        text = f'Tax {site.tax}%: {tax_amount} $'
+        text = f'Discount: -{order.discount} $'
         c.drawString(x_offset, y_offset, text)
-        total_price += tax_amount
 
     y_offset -= line_height
-    text = f'Shipping Cost: {total_shipping_cost} $'
+    text = f'Tax {order.tax_percent}%: {order.tax} $'
+    c.drawString(x_offset, y_offset, text)
+
+    y_offset -= line_height
+    text = f'Shipping Cost: {order.shipping_cost} $'
     c.drawString(x_offset, y_offset, text)
 
     y_offset -= 10
@@ -88,9 +106,66 @@ def make_pdf(order: Order):
     c.line(x_offset, y_offset, x_offset + 120, y_offset)
 
     y_offset -= 18
-    text = f'Total price: {total_price} $'
+    text = f'Total price: {order.total} $'
     c.drawString(x_offset, y_offset, text)
 
     c.save()
-    order.pdf_file = pdf_file_name
-    order.save()
+    return buffer.getvalue()
+
+
+def render_invoice(order: Order, force=False) -> str:
+    lines = invoice_lines(order)
+    digest = invoice_hash(order, lines)
+    if not force and order.pdf_hash == digest and order.pdf_file and default_storage.exists(order.pdf_file.name):
+        return order.pdf_file.name
+
+    name = f'{INVOICE_FOLDER}/order_{order.pk}.pdf'
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    name = default_storage.save(name, ContentFile(make_pdf(order, lines)))
+    Order.objects.filter(pk=order.pk).update(pdf_file=name, pdf_hash=digest)
+    order.pdf_file.name, order.pdf_hash = name, digest
+    return name
+
+
+class _ZipBuffer:
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def read_chunks(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def stream_invoices(orders, chunk_size=64 * 1024):
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for order in orders.order_by('pk').iterator(chunk_size=500):
+            with archive.open(f'order_{order.pk}.pdf', 'w', force_zip64=True) as entry:
+                if order.pdf_file and default_storage.exists(order.pdf_file.name):
+                    with default_storage.open(order.pdf_file.name, 'rb') as f:
+                        while chunk := f.read(chunk_size):
+                            entry.write(chunk)
+                            yield buffer.read_chunks()
+                else:
+                    entry.write(make_pdf(order))
+            yield buffer.read_chunks()
+    yield buffer.read_chunks()
+
+
+def invoices_zip_response(orders):
+    response = StreamingHttpResponse(stream_invoices(orders), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="invoices.zip"'
+    return response
@@ -1,85 +1,165 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth import logout
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.views import LoginView
-from django.db.models import F, Sum, Q
-from django.http import HttpResponseRedirect
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Sum
+from django.http import HttpResponseRedirect, HttpResponse, JsonResponse, FileResponse, Http404
 from django.shortcuts import redirect, get_object_or_404, render
 from django.urls import reverse_lazy
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localdate
 from django.views import View
 from django.views.generic import ListView, DetailView, UpdateView, CreateView, DeleteView, TemplateView, FormView
 
+from apps.cache import get_category_tree, catalog_page_key, get_tax_percent
+from apps.cart import get_cart_summary, cart_changed, add_to_cart, set_cart_quantity
+from apps.categories import filter_by_category
+from apps.coupons import check_coupon, normalize_code
+from apps.exports import EXPORTS, EXPORT_CHOICES, csv_response
+from apps.facets import compute_facets, price_band_q
+from apps.favorites import get_favorite_ids, set_favorite
 from apps.forms import UserRegisterModelForm, ReviewForm, AddressForm, OrderCreateModelForm, RecaptchaForm
-from apps.models import CreditCard, Order, SiteSettings, OrderItem
-from apps.models.products import Product, Category, CartItem, Favorite, User
+from apps.models import CreditCard, Order, DailySales, DailySalesTotal
+from apps.models.products import Product, CartItem, Favorite, User
 from apps.models.user import Address
-from apps.tasks import send_to_email
+from apps.pagination import KeysetPaginationMixin, paginate_by_cursor
+from apps.pricing import apply_tax, apply_discount
+from apps.reservations import hold_stock
+from apps.search import search_products
+from apps.specifications import filter_by_specification
+from apps.tasks import send_to_email, export_xlsx
+from apps.utils import render_invoice, invoices_zip_response
 
 
 class CategoryMixin:
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(object_list=object_list, **kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = get_category_tree()
         return context
 
 
-class ProductListView(CategoryMixin, ListView):
-    queryset = Product.objects.order_by('-created_at')
-    template_name = 'apps/product/product-list.html'
-    context_object_name = 'products'
-    paginate_by = 10
+class LikedProductsMixin:
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['liked_ids'] = set()
+        if self.request.user.is_authenticated:
+            context['liked_ids'] = get_favorite_ids(self.request.user.pk)
+        return context
 
-    def get_queryset(self):
-        qs = super().get_queryset()
+
+class AnonymousPageCacheMixin:
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+
+        key = catalog_page_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200 or not hasattr(response, 'render'):
+                return response
+            response.render()
+            entry = {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+            }
+            cache.set(key, entry, settings.CATALOG_PAGE_CACHE_TIMEOUT)
+
+        response = get_conditional_response(request, etag=entry['etag'])
+        if response is None:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+
+def catalog_queryset():
+    # the search vector is only read by the database; loading it would pull the whole tsvector for every row
+    return Product.objects.defer('search_vector').select_related('category').prefetch_related('images').annotate(
+        favorite_count=Count('favorite')
+    )
+
+
+class ProductFilterMixin:
+    def filter_queryset(self, qs):
         category_slug = self.request.GET.get('category')
+        tag_slug = self.request.GET.get('tag')
+        price_q = price_band_q(self.request.GET.get('price'))
+        in_stock = self.request.GET.get('in_stock')
         search_query = self.request.GET.get('search')
 
         if category_slug:
-            qs = qs.filter(category__slug=category_slug)
+            qs = filter_by_category(qs, category_slug)
+        if tag_slug:
+            qs = qs.filter(tags__slug=tag_slug)
+        if price_q:
+            qs = qs.filter(price_q)
+        if in_stock == '1':
+            qs = qs.filter(stock__gt=0)
+        elif in_stock == '0':
+            qs = qs.filter(stock=0)
+        qs = filter_by_specification(qs, self.request.GET)
         if search_query:
-            qs = qs.filter(
-                Q(title__icontains=search_query) |
-                Q(short_description__icontains=search_query) |
-                Q(long_description__icontains=search_query)
-            )
+            qs = search_products(qs, search_query)
         return qs
 
+    def get_queryset(self):
+        return self.filter_queryset(super().get_queryset())
 
-class ProductGridView(CategoryMixin, ListView):
-    queryset = Product.objects.all()
-    template_name = 'apps/product/product-grid.html'
+
+class ProductListView(ProductFilterMixin, AnonymousPageCacheMixin, KeysetPaginationMixin, LikedProductsMixin, CategoryMixin, ListView):
+    queryset = catalog_queryset().order_by('-created_at')
+    template_name = 'apps/product/product-list.html'
     context_object_name = 'products'
     paginate_by = 10
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['facets'] = compute_facets(
+            self.filter_queryset(Product.objects.all()), self.request.GET.get('category')
+        )
+        return context
 
-class ProductDetailView(CategoryMixin, DetailView):
-    model = Product
-    template_name = 'apps/product/product-detail.html'
-    context_object_name = 'product'
+
+class ProductGridView(ProductFilterMixin, AnonymousPageCacheMixin, KeysetPaginationMixin, LikedProductsMixin, CategoryMixin, ListView):
+    queryset = catalog_queryset().order_by('-created_at')
+    template_name = 'apps/product/product-grid.html'
+    context_object_name = 'products'
+    paginate_by = 10
 
 
-class ProductReviewView(DetailView):
-    model = Product
+class ProductDetailView(AnonymousPageCacheMixin, LikedProductsMixin, CategoryMixin, DetailView):
+    queryset = catalog_queryset().prefetch_related('tags')
     template_name = 'apps/product/product-detail.html'
     context_object_name = 'product'
+    reviews_per_page = 10
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        product = self.get_object()
-        reviews = product.reviews.all()
-        review_form = ReviewForm()
-
-        context['reviews'] = reviews
-        context['review_form'] = review_form
+        context['reviews'] = paginate_by_cursor(
+            self.object.reviews.all(), self.request.GET.get('reviews'), self.reviews_per_page, fields=('pk',)
+        )
+        context.setdefault('review_form', ReviewForm())
         return context
 
+
+class ProductReviewView(LoginRequiredMixin, ProductDetailView):
     def post(self, request, *args, **kwargs):
-        product = self.get_object()
+        self.object = self.get_object()
         review_form = ReviewForm(request.POST)
         if review_form.is_valid():
             review = review_form.save(commit=False)
-            review.product = product
+            review.product = self.object
             review.save()
-            return redirect('product_detail', pk=product.pk)
+            return redirect('product_detail', pk=self.object.pk)
         return self.render_to_response(self.get_context_data(review_form=review_form))
 
 
@@ -137,22 +217,33 @@ class CustomSettingsView(LoginRequiredMixin, CategoryMixin, UpdateView):
         return self.request.user
 
 
-class FavouriteView(LoginRequiredMixin, CategoryMixin, View):
+class FavouriteView(LoginRequiredMixin, View):
+    def post(self, request, pk, *args, **kwargs):
+        get_object_or_404(Product.objects.only('pk'), pk=pk)
+        liked = request.POST.get('liked')
+        if liked not in ('0', '1'):
+            liked = '0' if pk in get_favorite_ids(request.user.pk) else '1'
+
+        favorite_ids = set_favorite(request.user.pk, pk, liked == '1')
+        return JsonResponse({
+            'liked': pk in favorite_ids,
+            'favorite_count': Favorite.objects.filter(product_id=pk).count(),
+        })
+
+
+class FavouriteListView(LoginRequiredMixin, LikedProductsMixin, CategoryMixin, ListView):
     template_name = 'apps/shop/favourite.html'
+    context_object_name = 'products'
+    paginate_by = 12
 
-    def get(self, request, pk, *args, **kwargs):
-        obj, created = Favorite.objects.get_or_create(user=request.user, product_id=pk)
-        if not created:
-            obj.delete()
-        referer = request.META.get('HTTP_REFERER')
-        if referer:
-            return redirect(referer)
-        else:
-            return redirect('product_detail', pk=pk)
+    def get_queryset(self):
+        return catalog_queryset().filter(pk__in=get_favorite_ids(self.request.user.pk)).order_by('-created_at')
 
 
 class CartListView(CategoryMixin, ListView):
-    queryset = CartItem.objects.all()
+    queryset = CartItem.objects.select_related('product').defer('product__search_vector').prefetch_related(
+        'product__images'
+    )
     template_name = 'apps/shopping/shopping_cart.html'
     context_object_name = 'cart_items'
     success_url = reverse_lazy('shopping_cart_page')
@@ -162,14 +253,8 @@ class CartListView(CategoryMixin, ListView):
 
     def get_context_data(self, *, object_list=None, **kwargs):
         ctx = super().get_context_data(object_list=object_list, **kwargs)
-        qs = self.get_queryset()
-
-        ctx.update(
-            **qs.aggregate(
-                total_sum=Sum(F('quantity') * F('product__price') * (100 - F('product__discount_percent')) / 100),
-                total_count=Sum(F('quantity'))
-            )
-        )
+        summary = get_cart_summary(self.request.user.pk)
+        ctx.update(total_sum=summary['subtotal'], total_count=summary['count'])
         return ctx
 
 
@@ -183,27 +268,43 @@ class AddToCartView(LoginRequiredMixin, CreateView):
         pk = self.kwargs['pk']
         product = get_object_or_404(Product, id=pk)
 
-        cart_item, created = CartItem.objects.get_or_create(user=self.request.user, product=product)
+        add_to_cart(self.request.user.pk, product)
+        return redirect(self.get_success_url())
 
-        if not created:
-            cart_item.quantity += 1
-            cart_item.save()
 
-        return redirect(self.get_success_url())
+class CartItemQuantityView(LoginRequiredMixin, View):
+    def post(self, request, pk, *args, **kwargs):
+        try:
+            quantity = int(request.POST.get('quantity', ''))
+        except ValueError:
+            quantity = 0
+        if quantity < 1:
+            return JsonResponse({'error': 'Quantity must be a positive number.'}, status=400)
+
+        try:
+            new_quantity = set_cart_quantity(request.user.pk, pk, quantity)
+        except CartItem.DoesNotExist:
+            return JsonResponse({'error': 'Cart item not found.'}, status=404)
+
+        summary = get_cart_summary(request.user.pk)
+        return JsonResponse({
+            'new_quantity': new_quantity,
+            'total_sum': summary['subtotal'],
+            'total_count': summary['count'],
+        })
 
 
 class CartItemDeleteView(LoginRequiredMixin, View):
     success_url = reverse_lazy('shopping_cart_page')
 
     def get(self, request, pk, *args, **kwargs):
-        cart_item = CartItem.objects.filter(user=self.request.user, pk=pk).first()
-        if cart_item:
-            cart_item.delete()
+        if CartItem.objects.filter(user=self.request.user, pk=pk).delete()[0]:
+            cart_changed(self.request.user.pk)
         return redirect(self.success_url)
 
 
 class CheckoutView(LoginRequiredMixin, CategoryMixin, ListView):
-    queryset = CartItem.objects.all()
+    queryset = CartItem.objects.select_related('product').defer('product__search_vector')
     template_name = 'apps/shopping/checkout.html'
     context_object_name = 'cart_items'
 
@@ -215,34 +316,63 @@ class CheckoutView(LoginRequiredMixin, CategoryMixin, ListView):
 
         credit_cart = CreditCard.objects.filter(owner=self.request.user)
         addresses = Address.objects.filter(user=self.request.user)
-        sitesettings = SiteSettings.objects.first()
-
-        cart_items = self.get_queryset()
 
-        subtotal = cart_items.aggregate(
-            subtotal=Sum((F('quantity') * F('product__price') * (100 - F('product__discount_percent')) / 100))
-        )['subtotal'] or 0
-
-        shipping_cost = cart_items.aggregate(
-            shipping_cost=Sum(F('product__shipping_cost'))
-        )['shipping_cost'] or 0
+        try:
+            hold_stock(self.request.user.pk, context['cart_items'])
+        except ValidationError as e:
+            messages.error(self.request, e.messages[0])
+        else:
+            context['hold_minutes'] = settings.STOCK_HOLD_TIMEOUT // 60
 
-        total = subtotal + shipping_cost  # your coupon   - coupon_discount
-        scot = (total * sitesettings.tax) // 100
-        total += scot
+        coupon = self.get_coupon()
+        totals = get_cart_summary(self.request.user.pk)
+        if coupon:
+            totals = apply_discount(totals, coupon.discount_amount)
+        totals = apply_tax(totals, get_tax_percent())
 
         context.update({
             'credit_cards': credit_cart,
             'addresses': addresses,
-            'subtotal': subtotal,
-            'shipping_cost': shipping_cost,
-            'total': total,
-            'tax': sitesettings.tax,
-            'scot': scot
+            'coupon': coupon,
+            'subtotal': totals['subtotal'],
+            'discount': totals['discount'],
+            'shipping_cost': totals['shipping_cost'],
+            'total': totals['total'],
+            'tax': totals['tax_percent'],
+            'scot': totals['tax']
         })
         return context
 
 
+    def get_coupon(self):
+        code = self.request.session.get('coupon')
+        if not code:
+            return None
+        try:
+            return check_coupon(code, self.request.user.pk)
+        except ValidationError as e:
+            del self.request.session['coupon']
+            messages.error(self.request, e.messages[0])
+
+
+class ApplyCouponView(LoginRequiredMixin, View):
+    def post(self, request, *args, **kwargs):
+        code = normalize_code(request.POST.get('code'))
+        if not code:
+            request.session.pop('coupon', None)
+            messages.info(request, 'Coupon removed.')
+            return redirect('shopping_cart_page')
+
+        try:
+            coupon = check_coupon(code, request.user.pk)
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+        else:
+            request.session['coupon'] = code
+            messages.success(request, f'Coupon {coupon.code} applied.')
+        return redirect('shopping_cart_page')
+
+
 class AddressCreateView(CategoryMixin, CreateView):
     model = Address
     template_name = 'apps/address/create_address.html'
@@ -269,14 +399,20 @@ class CustomerOrderCreateView(LoginRequiredMixin, CategoryMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.owner = self.request.user
-        return super().form_valid(form)
+        try:
+            response = super().form_valid(form)
+        except ValidationError as e:
+            form.add_error(None, e)
+            return self.form_invalid(form)
+        self.request.session.pop('coupon', None)
+        return response
 
     def form_invalid(self, form):
         return super().form_invalid(form)
 
 
 class CustomOrderListView(CategoryMixin, ListView):
-    model = Order
+    queryset = Order.objects.select_related('owner', 'address')
     template_name = 'apps/customer/customer_order_list.html'
     context_object_name = 'orders'
     paginate_by = 10
@@ -288,7 +424,7 @@ class CustomOrderListView(CategoryMixin, ListView):
 
 
 class CustomOrderDetailView(CategoryMixin, DetailView):
-    model = Order
+    queryset = Order.objects.select_related('owner', 'address', 'creditcard')
     template_name = 'apps/customer/customer_order_detail.html'
     context_object_name = 'order'
 
@@ -299,30 +435,74 @@ class CustomOrderDetailView(CategoryMixin, DetailView):
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(object_list=object_list, **kwargs)
-        qs = OrderItem.objects.filter(order_id=context['order'].id)
-
-        context.update(
-            **qs.aggregate(
-                subtotal=Sum(F('quantity') * (F('product__price') * (
-                        100 - F('product__discount_percent')) / 100)),
-                shipping_cost=Sum(F('product__shipping_cost'))
-            )
+        context['order_items'] = self.object.orderitem_set.select_related('product').defer(
+            'product__search_vector'
         )
-
-        context['tax'] = SiteSettings.objects.first().tax
         return context
 
 
+class OrderInvoiceView(LoginRequiredMixin, View):
+    def get(self, request, pk, *args, **kwargs):
+        orders = Order.objects.all()
+        if not (request.user.is_staff or request.user.is_superuser):
+            orders = orders.filter(owner=request.user)
+        order = get_object_or_404(orders, pk=pk)
+        if not order.pdf_file or not order.pdf_file.storage.exists(order.pdf_file.name):
+            render_invoice(order)
+        return FileResponse(order.pdf_file.open('rb'), as_attachment=True, filename=f'order_{order.pk}.pdf')
+
+
+class StaffRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
+    def test_func(self):
+        return self.request.user.is_staff or self.request.user.is_superuser
+
+
+class OrderInvoiceExportView(StaffRequiredMixin, View):
+    def get(self, request, *args, **kwargs):
+        orders = Order.objects.all()
+        date_from = parse_date(request.GET.get('date_from') or '')
+        date_to = parse_date(request.GET.get('date_to') or '')
+        if date_from:
+            orders = orders.filter(created_at__date__gte=date_from)
+        if date_to:
+            orders = orders.filter(created_at__date__lte=date_to)
+        return invoices_zip_response(orders)
+
+
+class DataExportView(StaffRequiredMixin, View):
+    def get_filters(self, data):
+        return parse_date(data.get('date_from') or ''), parse_date(data.get('date_to') or '')
+
+    def get(self, request, name, *args, **kwargs):
+        if name not in EXPORTS:
+            raise Http404
+        return csv_response(name, *self.get_filters(request.GET))
+
+    def post(self, request, name, *args, **kwargs):
+        if name not in EXPORTS:
+            raise Http404
+        date_from, date_to = self.get_filters(request.POST)
+        export_xlsx.delay(name, request.user.email, request.build_absolute_uri('/').rstrip('/'),
+                          date_from and date_from.isoformat(), date_to and date_to.isoformat())
+        messages.success(request, f'The {name} export is being generated and will be emailed to {request.user.email}.')
+        return redirect('orders_list')
+
+
 class CustomerGetProView(CategoryMixin, TemplateView):
     template_name = 'apps/customer/customer_getpro.html'
 
 
 class OrderListView(CategoryMixin, ListView):  # ADMIN
-    model = Order
+    queryset = Order.objects.select_related('owner', 'address')
     template_name = 'apps/orders/order_list.html'
     context_object_name = 'orders'
     paginate_by = 10
 
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super().get_context_data(object_list=object_list, **kwargs)
+        context['export_choices'] = EXPORT_CHOICES
+        return context
+
     def get_queryset(self):
         if self.request.user.is_staff or self.request.user.is_superuser:
             return super().get_queryset()
@@ -340,6 +520,33 @@ class OrderDetailView(CategoryMixin, DetailView):  # ADMIN
         return super().get_queryset().filter(owner=self.request.user)
 
 
+class SalesDashboardView(StaffRequiredMixin, CategoryMixin, TemplateView):
+    template_name = 'apps/orders/sales_dashboard.html'
+    default_days = 30
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        date_to = parse_date(self.request.GET.get('date_to') or '') or localdate()
+        date_from = parse_date(self.request.GET.get('date_from') or '')
+        date_from = date_from or date_to - timedelta(days=self.default_days - 1)
+
+        days = DailySalesTotal.objects.filter(day__range=(date_from, date_to)).order_by('day')
+        sales = DailySales.objects.filter(day__range=(date_from, date_to))
+        context.update({
+            'date_from': date_from,
+            'date_to': date_to,
+            'days': days,
+            'totals': days.aggregate(units=Sum('units'), revenue=Sum('revenue'), orders=Sum('orders')),
+            'top_products': sales.values('product_id', 'product__title').annotate(
+                units=Sum('units'), revenue=Sum('revenue'), orders=Sum('orders')
+            ).order_by('-revenue')[:10],
+            'category_sales': sales.values('category_id', 'category__name').annotate(
+                units=Sum('units'), revenue=Sum('revenue')
+            ).order_by('-revenue'),
+        })
+        return context
+
+
 class OrderDeleteView(DeleteView):  # admin
     model = Order
     success_url = reverse_lazy('orders_list')
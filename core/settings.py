@@ -247,6 +247,39 @@ CELERY_RESULT_BACKEND = 'django-db'
 
 CELERY_CACHE_BACKEND = 'default'
 
+CELERY_BEAT_SCHEDULE = {
+    'refresh-sales-rollups': {
+        'task': 'apps.tasks.refresh_sales_rollups',
+        'schedule': 60 * 10,
+    },
+}
+
+# cache versions (category tree, catalog, cart, tax, coupons, stock holds) must be shared by every web and
+# Celery process, so a per-process LocMemCache is only acceptable for local development
+REDIS_CACHE_URL = os.getenv('REDIS_CACHE_URL') or ('' if DEBUG else 'redis://redis_service:6379/1')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if REDIS_CACHE_URL:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_CACHE_URL,
+    }
+
+CATEGORY_TREE_CACHE_TIMEOUT = 60 * 60 * 24
+CATALOG_PAGE_CACHE_TIMEOUT = 60 * 15
+CART_SUMMARY_CACHE_TIMEOUT = 60 * 60 * 24
+COUPON_CACHE_TIMEOUT = 60 * 60
+SITE_SETTINGS_CACHE_TIMEOUT = 60 * 5
+FAVORITES_CACHE_TIMEOUT = 60 * 60 * 24
+SALES_ROLLUP_OVERLAP = 60 * 5
+STOCK_HOLD_TIMEOUT = 60 * 10
+STOCK_HOLD_BUCKET = 60
+
+PRODUCT_IMAGE_WIDTHS = (160, 480, 960)
+
 JAZZMIN_SETTINGS = JAZZMIN_SETTINGS
 
 LOGGING = {